@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram.metrics import registry
+from recipes.counters import COUNTERS
+
+VERSION_KEY = 'auth_token_version'
+TOKEN_KEY = 'auth_token:{}'
+
+
+def snapshot_fields():
+    """Поля пользователя, которые можно хранить в кэше.
+
+    Пароль в кэш не попадает, а счётчики меняются запросами UPDATE без
+    сигналов, поэтому они остаются отложенными и читаются из базы.
+    """
+    user_model = get_user_model()
+    skipped = {'password'} | {
+        field for label, field, _, _ in COUNTERS
+        if label == user_model._meta.label
+    }
+    return [
+        field.attname for field in user_model._meta.concrete_fields
+        if field.attname not in skipped
+    ]
+
+
+def build_user(values):
+    """Пользователь из снимка, остальные поля загрузятся при обращении."""
+    user_model = get_user_model()
+    fields = [
+        field.attname for field in user_model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return user_model.from_db(
+        DEFAULT_DB_ALIAS, fields, [values[name] for name in fields]
+    )
+
+
+class TokenCache:
+    """Снимки пользователей по токенам: в памяти процесса и в общем кэше.
+
+    Запись в памяти процесса действительна, пока не изменилась версия в
+    общем кэше; отзыв любого токена меняет версию, и процессы забывают
+    свои записи. Число записей и их время жизни ограничены.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def get(self, key):
+        version = cache.get(VERSION_KEY)
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        values = cache.get(TOKEN_KEY.format(key))
+        if values is not None:
+            self._remember(key, values, version)
+        return values
+
+    def set(self, key, values):
+        cache.set(TOKEN_KEY.format(key), values, settings.TOKEN_CACHE_TIMEOUT)
+        self._remember(key, values, cache.get(VERSION_KEY))
+
+    def revoke(self, keys):
+        """Забыть токены сейчас и ещё раз после фиксации транзакции.
+
+        Запрос, пришедший до фиксации, прочитает из базы старую строку
+        пользователя и снова положит её в кэш; повтор после фиксации
+        убирает и её.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        self._forget(keys)
+        transaction.on_commit(lambda: self._forget(keys))
+
+    def _forget(self, keys):
+        cache.delete_many([TOKEN_KEY.format(key) for key in keys])
+        cache.set(VERSION_KEY, uuid4().hex, None)
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def _remember(self, key, values, version):
+        expires = time.monotonic() + settings.TOKEN_CACHE_TIMEOUT
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (expires, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для известного токена."""
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_ENABLED:
+            return super().authenticate_credentials(key)
+        values = token_cache.get(key)
+        registry.inc('foodgram_cache_requests_total', cache='token',
+                     result='miss' if values is None else 'hit')
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, {
+                name: getattr(user, name) for name in snapshot_fields()
+            })
+            return user, token
+        if not values['is_active']:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        user = build_user(values)
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,227 @@
+import random
+from collections import namedtuple
+
+from api.documents import update_documents
+from api.response_cache import bump_generation
+from api.signals import CACHED_MODELS
+from recipes.counters import repair_counters
+from recipes.feed import rebuild_feeds
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientRecipe,
+                            Recipe, ShoppingCart, Tag)
+from recipes.pantry_index import pantry_index
+from recipes.scores import compute_scores
+from recipes.search import update_search
+from recipes.shopping_cart import invalidate_carts
+from users.models import Subscribe, User
+
+PREFIX = 'bench'
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.')
+
+# budget - максимум запросов на странице из ROWS[-1] строк,
+# per_row - сколько запросов допускается добавлять на каждую строку.
+Endpoint = namedtuple('Endpoint', ('name', 'url', 'auth', 'budget', 'per_row'))
+
+ENDPOINTS = (
+    Endpoint('recipes', '/api/recipes/?limit={rows}', False, 4, 0),
+    Endpoint('recipes_auth', '/api/recipes/?limit={rows}', True, 6, 0),
+    Endpoint('recipes_cursor', '/api/recipes/?limit={rows}&cursor=',
+             False, 3, 0),
+    Endpoint('recipes_uncounted', '/api/recipes/?limit={rows}&count=none',
+             False, 3, 0),
+    Endpoint('recipes_popular',
+             '/api/recipes/?limit={rows}&ordering=popular',
+             False, 4, 0),
+    Endpoint('recipes_trending',
+             '/api/recipes/?limit={rows}&ordering=trending',
+             False, 4, 0),
+    Endpoint('recipes_search',
+             f'/api/recipes/?limit={{rows}}&search={PREFIX}%201',
+             False, 4, 0),
+    Endpoint('recipes_cook', '/api/recipes/cook/?limit={rows}&{pantry}',
+             False, 4, 0),
+    Endpoint('recipes_tags',
+             f'/api/recipes/?limit={{rows}}&tags={PREFIX}-0&tags={PREFIX}-1',
+             True, 7, 0),
+    Endpoint('recipes_favorited',
+             '/api/recipes/?limit={rows}&is_favorited=1', True, 6, 0),
+    Endpoint('recipes_in_cart',
+             '/api/recipes/?limit={rows}&is_in_shopping_cart=1', True, 6, 0),
+    Endpoint('feed', '/api/recipes/feed/?limit={rows}', True, 5, 0),
+    Endpoint('recipe_detail', '/api/recipes/{recipe}/', True, 5, 0),
+    Endpoint('subscriptions',
+             '/api/users/subscriptions/?limit={rows}&recipes_limit=3',
+             True, 4, 0),
+    Endpoint('users', '/api/users/?limit={rows}', True, 4, 0),
+    Endpoint('ingredients', f'/api/ingredients/?name={PREFIX}', False, 1, 0),
+    Endpoint('tags', '/api/tags/', False, 1, 0),
+    Endpoint('shopping_list', '/api/recipes/shopping_cart/', True, 2, 0),
+    Endpoint('download_shopping_cart',
+             '/api/recipes/download_shopping_cart/', True, 3, 0),
+)
+ROWS = (5, 50)
+
+
+def add_data_arguments(parser):
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--recipes', type=int, default=5000)
+    parser.add_argument('--ingredients', type=int, default=1000)
+    parser.add_argument('--favorites', type=int, default=20000)
+    parser.add_argument('--carts', type=int, default=10000)
+    parser.add_argument('--subscriptions', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--only', nargs='*', default=None,
+        help='Имена эндпоинтов для замера'
+    )
+
+
+def selected_endpoints(options):
+    return [
+        endpoint for endpoint in ENDPOINTS
+        if not options['only'] or endpoint.name in options['only']
+    ]
+
+
+def generate(options):
+    """Пользователи, рецепты, избранное, корзины и подписки для замеров.
+
+    Возвращает пользователя с большим числом связей и id рецепта.
+    """
+    Tag.objects.bulk_create(
+        Tag(name=f'{PREFIX} {i}', color='#000000', slug=f'{PREFIX}-{i}')
+        for i in range(4)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'{PREFIX} ингредиент {i}',
+                   measurement_unit=random.choice(UNITS))
+        for i in range(options['ingredients'])
+    )
+    User.objects.bulk_create(
+        User(username=f'{PREFIX}{i}', email=f'{PREFIX}{i}@example.com',
+             first_name='Имя', last_name='Фамилия', password='!')
+        for i in range(options['users'])
+    )
+    users = list(User.objects.filter(
+        username__startswith=PREFIX).values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        Recipe(author_id=random.choice(users), name=f'{PREFIX} {i}',
+               image='recipes/image.jpeg', text='Описание',
+               cooking_time=random.randint(1, 120),
+               servings=random.randint(1, 6))
+        for i in range(options['recipes'])
+    )
+    recipes = list(Recipe.objects.filter(
+        author_id__in=users).values_list('id', flat=True))
+    ingredients = list(Ingredient.objects.filter(
+        name__startswith=PREFIX).values_list('id', flat=True))
+    tags = list(Tag.objects.filter(
+        slug__startswith=PREFIX).values_list('id', flat=True))
+    tag_through = Recipe.tags.through
+    tag_through.objects.bulk_create(
+        tag_through(recipe_id=recipe, tag_id=tag)
+        for recipe in recipes
+        for tag in random.sample(tags, random.randint(1, 2))
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe_id=recipe, ingredient_id=ingredient,
+                         amount=random.randint(1, 500))
+        for recipe in recipes
+        for ingredient in random.sample(ingredients, 6)
+    )
+    user = User.objects.get(id=users[0])
+    for model, size in ((FavoriteRecipe, options['favorites']),
+                        (ShoppingCart, options['carts'])):
+        model.objects.bulk_create(
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in random_pairs(users, recipes, size)
+        )
+    Subscribe.objects.bulk_create(
+        Subscribe(user_id=user_id, author_id=author_id)
+        for user_id, author_id in random_pairs(
+            users, users, options['subscriptions'])
+        if user_id != author_id
+    )
+    heavy_user(user, users, recipes)
+    repair_counters()
+    rebuild_feeds()
+    compute_scores(full=True)
+    update_search()
+    update_documents(recipes)
+    reset_response_cache(user)
+    return user, recipes[0]
+
+
+def heavy_user(user, users, recipes):
+    """Пользователь с большим числом подписок, избранного и корзиной."""
+    Subscribe.objects.filter(user=user).delete()
+    FavoriteRecipe.objects.filter(user=user).delete()
+    ShoppingCart.objects.filter(user=user).delete()
+    Subscribe.objects.bulk_create(
+        Subscribe(user=user, author_id=author_id)
+        for author_id in users[1:301]
+    )
+    FavoriteRecipe.objects.bulk_create(
+        FavoriteRecipe(user=user, recipe_id=recipe_id)
+        for recipe_id in recipes[:200]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe_id=recipe_id,
+                     servings=random.choice((None, 2, 4)))
+        for recipe_id in recipes[:30]
+    )
+
+
+def pantry_query(recipe_id, extra=20):
+    """Параметры cook: ингредиенты рецепта и ещё extra случайных."""
+    ingredients = list(IngredientRecipe.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True))
+    ingredients += random.sample(list(Ingredient.objects.filter(
+        name__startswith=PREFIX).values_list('id', flat=True)), extra)
+    return '&'.join(f'ingredients={ingredient}' for ingredient in ingredients)
+
+
+def reset_response_cache(user=None):
+    """Сбросить кэши ответов, индексы и список покупок user.
+
+    Данные созданы через bulk_create, сигналы не отправлялись, а каждый
+    замер начинается с пустых кэшей.
+    """
+    for model in CACHED_MODELS:
+        bump_generation(model)
+    ingredient_index.invalidate()
+    pantry_index.invalidate()
+    if user is not None:
+        invalidate_carts([user.id])
+
+
+def budget_failures(endpoint, queries):
+    """Нарушения бюджета по числу запросов на страницах из ROWS строк."""
+    failures = []
+    small, large = ROWS[0], ROWS[-1]
+    if queries[large] > endpoint.budget:
+        failures.append(
+            f'{endpoint.name}: {queries[large]} > {endpoint.budget}'
+        )
+    growth = queries[large] - queries[small]
+    if growth > endpoint.per_row * (large - small):
+        failures.append(
+            f'{endpoint.name}: +{growth} запросов на '
+            f'{large - small} строк'
+        )
+    return failures
+
+
+def random_pairs(left, right, size):
+    """Уникальные случайные пары для таблиц с UniqueConstraint."""
+    pairs = set()
+    size = min(size, len(left) * len(right))
+    while len(pairs) < size:
+        pairs.add((random.choice(left), random.choice(right)))
+    return pairs
+
+
+def response_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
@@ -0,0 +1,160 @@
+from itertools import chain
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+
+from api.projections import recipe_list, recipe_values
+from api.renderers import Raw, dumps
+from api.user_state import get_user_state
+from recipes.models import Recipe, RecipeDocument
+from recipes.search import rank_fields
+
+BATCH_SIZE = 500
+# JSON экранирует управляющие символы, в тексте документа они
+# встречаются только как метки: SLOT - место для значения на чтении,
+# ORIGIN - схема и хост перед относительной ссылкой на фото.
+SLOT = '\x01'
+ORIGIN = '\x02'
+LIVE_FIELDS = (
+    'favorites_count', 'in_carts_count', 'is_favorited', 'is_in_shopping_cart'
+)
+DOCUMENT_FIELDS = ('id', 'author_id', *LIVE_FIELDS)
+
+
+def absolute(url):
+    """Ссылка, которую request.build_absolute_uri дополнит хостом."""
+    if url is None or urlsplit(url).netloc:
+        return url
+    return Raw(f'"{ORIGIN}{dumps(url)[1:]}')
+
+
+def render_document(item):
+    """Текст документа из словаря RecipeGetSerializer без request."""
+    item['author']['is_subscribed'] = Raw(SLOT)
+    for field in LIVE_FIELDS:
+        item[field] = Raw(SLOT)
+    item['image'] = absolute(item['image'])
+    item['image_variants'] = {
+        variant: {
+            extension: absolute(url) for extension, url in files.items()
+        }
+        for variant, files in item['image_variants'].items()
+    }
+    return dumps(item)
+
+
+def build_documents(recipe_ids):
+    """Документы рецептов: id -> текст."""
+    rows = list(recipe_values(
+        Recipe.objects.with_user_flags(AnonymousUser()).filter(
+            id__in=recipe_ids
+        )
+    ))
+    return {
+        item['id']: render_document(item)
+        for item in recipe_list(rows, None)
+    }
+
+
+def save_documents(documents):
+    RecipeDocument.objects.bulk_create(
+        (RecipeDocument(recipe_id=recipe_id, content=content)
+         for recipe_id, content in documents.items()),
+        ignore_conflicts=True
+    )
+
+
+def update_documents(recipe_ids, batch_size=BATCH_SIZE):
+    """Пересобрать документы рецептов; удалённых рецептов не будет."""
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), batch_size):
+        batch = recipe_ids[start:start + batch_size]
+        with transaction.atomic():
+            RecipeDocument.objects.filter(recipe_id__in=batch).delete()
+            save_documents(build_documents(batch))
+    return len(recipe_ids)
+
+
+class PendingDocuments:
+    """Рецепты транзакции, документы которых соберутся после фиксации."""
+
+    def __init__(self, recipe_ids):
+        self.recipe_ids = recipe_ids
+
+    def __call__(self):
+        update_documents(self.recipe_ids)
+
+
+def schedule_documents(recipe_ids):
+    """Документы удаляются в транзакции изменения, а собираются заново
+    после фиксации, когда записаны теги и ингредиенты.
+
+    Сохранение рецепта вызывает несколько сигналов; все они попадают в
+    одну пересборку. При откате транзакции она отменяется вместе с
+    остальными on_commit.
+    """
+    connection = transaction.get_connection()
+    pending = next((
+        entry[1] for entry in connection.run_on_commit
+        if isinstance(entry[1], PendingDocuments)
+    ), None)
+    recipe_ids = set(recipe_ids)
+    if pending is not None:
+        recipe_ids -= pending.recipe_ids
+    if not recipe_ids:
+        return
+    RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+    if pending is None:
+        transaction.on_commit(PendingDocuments(recipe_ids))
+    else:
+        pending.recipe_ids |= recipe_ids
+
+
+def document_values(queryset):
+    """values() для сборки из документов, с рангом поиска, если он есть.
+
+    Сами документы читаются отдельно по id: в DISTINCT фильтра по тегам
+    и в COUNT(*) длинный текст только мешает.
+    """
+    return queryset.values(*DOCUMENT_FIELDS, *rank_fields(queryset))
+
+
+def flag(value):
+    return 'true' if value else 'false'
+
+
+def assemble(rows, request):
+    """Рецепты как в RecipeGetSerializer(many=True): документы с
+    флагами пользователя и счётчиками на местах SLOT.
+
+    Отсутствующие документы собираются и сохраняются здесь же.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    ids = [row['id'] for row in rows]
+    documents = dict(RecipeDocument.objects.filter(
+        recipe_id__in=ids
+    ).values_list('recipe_id', 'content'))
+    missing = [recipe_id for recipe_id in ids if recipe_id not in documents]
+    if missing:
+        built = build_documents(missing)
+        save_documents(built)
+        documents.update(built)
+    origin = dumps(request.build_absolute_uri('/')[:-1])[1:-1]
+    subscriptions = get_user_state(request).subscriptions
+    items = []
+    for row in rows:
+        parts = documents[row['id']].replace(ORIGIN, origin).split(SLOT)
+        values = (
+            flag(row['author_id'] in subscriptions),
+            str(row['favorites_count']),
+            str(row['in_carts_count']),
+            flag(row['is_favorited']),
+            flag(row['is_in_shopping_cart']),
+        )
+        items.append(Raw(
+            ''.join(chain.from_iterable(zip(parts, values))) + parts[-1]
+        ))
+    return items
@@ -0,0 +1,43 @@
+import csv
+from datetime import datetime
+
+
+class Echo:
+    """Буфер для csv.writer, который возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_txt(user, ingredients):
+    today = datetime.today()
+    yield (
+        f'Список покупок для: {user.get_full_name()}\n\n'
+        f'Дата: {today:%Y-%m-%d}\n\n'
+    )
+    separator = ''
+    for ingredient in ingredients:
+        yield (
+            f'{separator}- {ingredient["name"]} '
+            f'({ingredient["measurement_unit"]})'
+            f' - {ingredient["amount"]}'
+        )
+        separator = '\n'
+    yield f'\n\nFoodgram ({today:%Y})'
+
+
+def shopping_list_csv(user, ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'],
+            ingredient['measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain', shopping_list_txt),
+    'csv': ('text/csv', shopping_list_csv),
+}
@@ -1,9 +1,107 @@
 import base64
+import binascii
+from io import BytesIO
 
 import webcolors
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
 from rest_framework import serializers
 
+from recipes.images import decode_slots
+from recipes.models import Recipe
+
+BASE64_MARKER = ';base64,'
+# Символов base64 за шаг декодирования, кратно 4.
+DECODE_CHUNK = 64 * 1024
+
+
+def sniff_image(header):
+    """Расширение по сигнатуре файла или None, если это не изображение."""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def check_size(size):
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            'Размер фото больше '
+            f'{settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)} МБ'
+        )
+
+
+def decoded_chunks(data, start):
+    """Части base64 из data с позиции start, декодированные по очереди.
+
+    Пробелы и переводы строк пропускаются; символы сверх кратного 4
+    переносятся в следующую часть.
+    """
+    pending = ''
+    for offset in range(start, len(data), DECODE_CHUNK):
+        text = pending + ''.join(data[offset:offset + DECODE_CHUNK].split())
+        usable = len(text) - len(text) % 4
+        pending = text[usable:]
+        if usable:
+            yield base64.b64decode(text[:usable], validate=True)
+    if pending:
+        yield base64.b64decode(pending, validate=True)
+
+
+def decode_data_uri(data):
+    """Декодирует data URI частями во временный файл.
+
+    Размер проверяется по длине строки до декодирования, тип - по
+    первым байтам. Файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE пишутся
+    на диск, как и обычные загрузки Django.
+    """
+    start = data.find(BASE64_MARKER)
+    if start == -1:
+        raise serializers.ValidationError('Ожидается фото в base64')
+    start += len(BASE64_MARKER)
+    estimated_size = (len(data) - start) * 3 // 4
+    check_size(estimated_size)
+    if estimated_size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        upload = TemporaryUploadedFile('image', None, 0, None)
+    else:
+        upload = InMemoryUploadedFile(
+            BytesIO(), None, 'image', None, 0, None
+        )
+    extension = None
+    try:
+        for chunk in decoded_chunks(data, start):
+            if extension is None:
+                extension = sniff_image(chunk)
+                if extension is None:
+                    raise serializers.ValidationError(
+                        'Файл не является изображением'
+                    )
+            upload.write(chunk)
+            upload.size += len(chunk)
+    except binascii.Error:
+        upload.close()
+        raise serializers.ValidationError('Некорректный base64')
+    except serializers.ValidationError:
+        upload.close()
+        raise
+    upload.name = f'image.{extension}'
+    upload.seek(0)
+    return upload
+
+
+def check_upload(upload):
+    check_size(upload.size)
+    header = upload.read(12)
+    upload.seek(0)
+    if sniff_image(header) is None:
+        raise serializers.ValidationError('Файл не является изображением')
+
 
 class Hex2NameColor(serializers.Field):
     """Сериализатор цвета в тегах."""
@@ -19,11 +117,29 @@ class Hex2NameColor(serializers.Field):
 
 
 class Base64ImageField(serializers.ImageField):
-    """Кастомное поле для кодирования изображения в base64."""
+    """Фото в base64 (data URI) или файлом из multipart-запроса."""
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='images.' + ext)
+        with decode_slots:
+            if isinstance(data, str) and data.startswith('data:image'):
+                data = decode_data_uri(data)
+            elif hasattr(data, 'size') and hasattr(data, 'read'):
+                check_upload(data)
 
-        return super().to_internal_value(data)
+            return super().to_internal_value(data)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии фото по размерам и форматам."""
+
+    def to_representation(self, value):
+        storage = Recipe._meta.get_field('image').storage
+        request = self.context.get('request')
+        urls = {}
+        for variant, files in value.items():
+            urls[variant] = {}
+            for extension, name in files.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[variant][extension] = url
+        return urls
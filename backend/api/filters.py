@@ -31,17 +31,21 @@
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 
 User = get_user_model()
 
-
-class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+# Порядок по счётчику, при равенстве - по id, чтобы страницы не
+# пересекались. Обратный порядок использует тот же индекс.
+ORDERINGS = {
+    'favorites_count': ('favorites_count', 'id'),
+    '-favorites_count': ('-favorites_count', '-id'),
+    'in_carts_count': ('in_carts_count', 'id'),
+    '-in_carts_count': ('-in_carts_count', '-id'),
+    'popular': ('-popular_score', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
 
 
 class RecipeFilter(FilterSet):
@@ -55,6 +59,11 @@ class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
@@ -71,3 +80,9 @@ class RecipeFilter(FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(shopping_cart__user=user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
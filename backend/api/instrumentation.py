@@ -0,0 +1,187 @@
+import json
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from api.metrics import view_name
+from foodgram.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Списки IN разной длины - один и тот же запрос.
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+TOP_SHAPES = 5
+SHAPE_MAX_LENGTH = 500
+
+
+def query_shape(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestMetrics:
+    """Запросы к базе и время этапов одного HTTP-запроса.
+
+    Объект передаётся в connection.execute_wrapper и считает запросы по
+    тексту SQL; приведение к общему виду откладывается до отчёта.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_done = None
+        self.finished = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = {}
+        self.shapes = {}
+        self.duplicates = 0
+        self.max_repeats = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            statement = self.statements.get(sql)
+            if statement is None:
+                self.statements[sql] = [1, elapsed]
+            else:
+                statement[0] += 1
+                statement[1] += elapsed
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        shapes = {}
+        for sql, (count, elapsed) in self.statements.items():
+            shape = shapes.setdefault(query_shape(sql), [0, 0.0])
+            shape[0] += count
+            shape[1] += elapsed
+        self.shapes = shapes
+        self.duplicates = sum(count - 1 for count, _ in shapes.values())
+        self.max_repeats = max(
+            (count for count, _ in shapes.values()), default=0
+        )
+
+    @property
+    def total(self):
+        return self.finished - self.started
+
+    @property
+    def render_time(self):
+        if self.view_done is None:
+            return 0.0
+        return self.finished - self.view_done
+
+    @property
+    def app_time(self):
+        return max(self.total - self.sql_time - self.render_time, 0.0)
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={milliseconds(self.sql_time)};'
+            f'desc="{self.queries} queries, {self.duplicates} duplicate"',
+            f'app;dur={milliseconds(self.app_time)}',
+            f'render;dur={milliseconds(self.render_time)}',
+            f'total;dur={milliseconds(self.total)}',
+        ))
+
+    def top_shapes(self, limit=TOP_SHAPES):
+        shapes = sorted(
+            self.shapes.items(), key=lambda item: item[1][1], reverse=True
+        )
+        return [
+            {
+                'sql': shape[:SHAPE_MAX_LENGTH],
+                'count': count,
+                'ms': milliseconds(elapsed),
+            }
+            for shape, (count, elapsed) in shapes[:limit]
+        ]
+
+    def record(self, request, response):
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': milliseconds(self.total),
+            'db_ms': milliseconds(self.sql_time),
+            'app_ms': milliseconds(self.app_time),
+            'render_ms': milliseconds(self.render_time),
+            'queries': self.queries,
+            'duplicates': self.duplicates,
+            'top_queries': self.top_shapes(),
+        }
+
+
+class InstrumentationMiddleware:
+    """Метрики, Server-Timing и журнал медленных запросов.
+
+    Время ответа каждого запроса попадает в метрики. Запросы к базе
+    замеряются у доли запросов INSTRUMENTATION_SAMPLE_RATE. В журнал
+    попадают замеренные запросы дольше SLOW_REQUEST_MS и запросы, где
+    один и тот же SQL выполнялся DUPLICATE_QUERY_THRESHOLD раз и больше.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        if random.random() < settings.INSTRUMENTATION_SAMPLE_RATE:
+            response = self.measure(request)
+        else:
+            response = self.get_response(request)
+        self.count(request, response, time.perf_counter() - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_name(view_func, request.method)
+
+    def count(self, request, response, elapsed):
+        view = getattr(request, '_metrics_view', 'unknown')
+        registry.inc('foodgram_requests_total', view=view,
+                     method=request.method, status=response.status_code)
+        registry.observe('foodgram_request_duration_seconds', elapsed,
+                         view=view, method=request.method)
+        metrics = getattr(request, '_metrics', None)
+        if metrics is not None:
+            registry.observe('foodgram_request_queries', metrics.queries,
+                             view=view, method=request.method)
+        registry.flush()
+
+    def measure(self, request):
+        metrics = request._metrics = RequestMetrics()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        metrics.finish()
+        response['Server-Timing'] = metrics.server_timing()
+        slow = metrics.total * 1000 >= settings.SLOW_REQUEST_MS
+        repeated = metrics.max_repeats >= settings.DUPLICATE_QUERY_THRESHOLD
+        if slow or repeated:
+            logger.warning(
+                'Медленный запрос: %s' if slow
+                else 'Повторяющиеся запросы: %s',
+                json.dumps(metrics.record(request, response),
+                           ensure_ascii=False)
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # Дальше ответ только отрисовывается.
+        metrics = getattr(request, '_metrics', None)
+        if metrics is not None:
+            metrics.view_done = time.perf_counter()
+        return response
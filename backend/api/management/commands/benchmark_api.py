@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmark import (ROWS, add_data_arguments, budget_failures,
+                           generate, pantry_query, reset_response_cache,
+                           response_size, selected_endpoints)
+
+
+class Command(BaseCommand):
+    help = (' Замерить число запросов, время и размер ответа эндпоинтов API'
+            ' на сгенерированных данных ')
+
+    def add_arguments(self, parser):
+        add_data_arguments(parser)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        endpoints = selected_endpoints(options)
+        with transaction.atomic():
+            self.stdout.write(self.style.WARNING('Генерация данных'))
+            user, recipe_id = generate(options)
+            client = APIClient()
+            token = Token.objects.create(user=user)
+            pantry = pantry_query(recipe_id)
+            failures = []
+            for endpoint in endpoints:
+                failures += self.measure(
+                    client, endpoint, token, recipe_id, pantry,
+                    options['repeat']
+                )
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(
+                'Превышен бюджет запросов:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджеты запросов соблюдены'))
+
+    def measure(self, client, endpoint, token, recipe_id, pantry, repeat):
+        if endpoint.auth:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        else:
+            client.credentials()
+        queries = {}
+        for rows in ROWS:
+            reset_response_cache(token.user)
+            url = endpoint.url.format(
+                rows=rows, recipe=recipe_id, pantry=pantry
+            )
+            timings, counts = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                    size = response_size(response)
+                timings.append(time.perf_counter() - started)
+                counts.append(len(context))
+            if response.status_code != 200:
+                return [f'{endpoint.name}: статус {response.status_code}']
+            # Бюджет проверяется по первому запросу, пока кэши пусты.
+            queries[rows] = counts[0]
+            self.stdout.write(
+                f'{endpoint.name:<24} rows={rows:<4} '
+                f'queries={counts[0]:<4} warm={counts[-1]:<4} '
+                f'time={statistics.median(timings) * 1000:8.2f}ms '
+                f'size={size}'
+            )
+        return budget_failures(endpoint, queries)
@@ -0,0 +1,113 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.benchmark import (ENDPOINTS, ROWS, add_data_arguments, generate,
+                           reset_response_cache)
+from api.renderers import FastJSONRenderer, orjson
+
+# Ответы, у которых есть путь без сериализаторов.
+NAMES = (
+    'recipes', 'recipes_auth', 'recipes_popular', 'recipes_search',
+    'recipes_tags', 'recipe_detail', 'subscriptions', 'ingredients', 'tags',
+)
+
+
+class Command(BaseCommand):
+    help = (' Сравнить процессорное время ответов через сериализаторы и'
+            ' через FAST_READ_PATH, проверить побайтное совпадение ответов ')
+
+    def add_arguments(self, parser):
+        add_data_arguments(parser)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if endpoint.name in NAMES
+            and (not options['only'] or endpoint.name in options['only'])
+        ]
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен, FastJSONRenderer = JSONRenderer'
+            ))
+        with transaction.atomic():
+            self.stdout.write(self.style.WARNING('Генерация данных'))
+            user, recipe_id = generate(options)
+            client = APIClient()
+            token = Token.objects.create(user=user)
+            failures = []
+            for endpoint in endpoints:
+                failures += self.measure(
+                    client, endpoint, token, recipe_id, options['repeat']
+                )
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(
+                'Ответы различаются:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают побайтно'))
+
+    def measure(self, client, endpoint, token, recipe_id, repeat):
+        if endpoint.auth:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        else:
+            client.credentials()
+        url = endpoint.url.format(rows=ROWS[-1], recipe=recipe_id)
+        timings, contents, data = {}, {}, None
+        for fast in (False, True):
+            with override_settings(FAST_READ_PATH=fast):
+                timings[fast], response = self.cpu_time(client, url, repeat)
+            if response.status_code != 200:
+                return [f'{endpoint.name}: статус {response.status_code}']
+            contents[fast] = response.content
+            if data is None:
+                data = response.data
+        renderers = {
+            name: self.render_time(renderer, data, repeat)
+            for name, renderer in (
+                ('json', JSONRenderer()), ('orjson', FastJSONRenderer())
+            )
+        }
+        self.stdout.write(
+            f'{endpoint.name:<20} '
+            f'serializers={timings[False] * 1000:8.2f}ms '
+            f'fast={timings[True] * 1000:8.2f}ms '
+            f'x{timings[False] / timings[True]:<5.1f} '
+            f'json={renderers["json"][0] * 1000:7.2f}ms '
+            f'orjson={renderers["orjson"][0] * 1000:7.2f}ms'
+        )
+        failures = []
+        if contents[False] != contents[True]:
+            failures.append(f'{endpoint.name}: FAST_READ_PATH')
+        if renderers['json'][1] != renderers['orjson'][1]:
+            failures.append(f'{endpoint.name}: FastJSONRenderer')
+        return failures
+
+    @staticmethod
+    def cpu_time(client, url, repeat):
+        """Медиана процессорного времени ответа без кэша ответов."""
+        timings = []
+        for _ in range(repeat):
+            reset_response_cache()
+            started = time.process_time()
+            response = client.get(url)
+            timings.append(time.process_time() - started)
+        return statistics.median(timings), response
+
+    @staticmethod
+    def render_time(renderer, data, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.process_time()
+            content = renderer.render(data)
+            timings.append(time.process_time() - started)
+        return statistics.median(timings), content
@@ -0,0 +1,122 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmark import (ROWS, add_data_arguments, generate, pantry_query,
+                           response_size, selected_endpoints)
+
+
+def postgresql_seq_scans(cursor, sql):
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes, tables = [plan[0]['Plan']], []
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            tables.append(node['Relation Name'])
+        nodes += node.get('Plans', [])
+    return tables
+
+
+def sqlite_seq_scans(cursor, sql):
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+    tables = []
+    for row in cursor.fetchall():
+        detail = row[-1].split()
+        # Виртуальная таблица FTS5 читается через свой индекс.
+        if detail[0] == 'SCAN' and not {'USING', 'VIRTUAL'} & set(detail):
+            tables.append(detail[2] if detail[1] == 'TABLE' else detail[1])
+    return tables
+
+
+SEQ_SCANS = {
+    'postgresql': postgresql_seq_scans,
+    'sqlite': sqlite_seq_scans,
+}
+
+
+class Command(BaseCommand):
+    help = (' Найти запросы эндпоинтов API, которые читают таблицы'
+            ' последовательным сканированием ')
+
+    def add_arguments(self, parser):
+        add_data_arguments(parser)
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Таблицы меньшего размера планировщик сканирует по праву'
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершиться с ошибкой, если найдены сканирования'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SEQ_SCANS:
+            raise CommandError(f'{connection.vendor} не поддерживается')
+        random.seed(options['seed'])
+        with transaction.atomic():
+            self.stdout.write(self.style.WARNING('Генерация данных'))
+            user, recipe_id = generate(options)
+            token = Token.objects.create(user=user)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.sizes = self.table_sizes()
+            pantry = pantry_query(recipe_id)
+            found = 0
+            for endpoint in selected_endpoints(options):
+                found += self.explain(
+                    endpoint, token, recipe_id, pantry, options['min_rows']
+                )
+            transaction.set_rollback(True)
+        if found and options['strict']:
+            raise CommandError(f'Последовательных сканирований: {found}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Последовательных сканирований: {found}'
+        ))
+
+    def table_sizes(self):
+        sizes = {}
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names(cursor):
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}'
+                )
+                sizes[table] = cursor.fetchone()[0]
+        return sizes
+
+    def explain(self, endpoint, token, recipe_id, pantry, min_rows):
+        client = APIClient()
+        if endpoint.auth:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        url = endpoint.url.format(
+            rows=ROWS[-1], recipe=recipe_id, pantry=pantry
+        )
+        with CaptureQueriesContext(connection) as context:
+            response_size(client.get(url))
+        found = 0
+        seen = set()
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or sql in seen:
+                    continue
+                seen.add(sql)
+                tables = [
+                    table
+                    for table in SEQ_SCANS[connection.vendor](cursor, sql)
+                    if self.sizes.get(table, 0) >= min_rows
+                ]
+                if tables:
+                    found += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'{endpoint.name}: {", ".join(tables)}'
+                    ))
+                    self.stdout.write(f'  {sql[:300]}')
+        return found
@@ -0,0 +1,47 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.documents import BATCH_SIZE, update_documents
+from recipes.models import Recipe
+
+
+def rebuild_batch(recipe_ids):
+    try:
+        return update_documents(recipe_ids)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (' Пересобрать JSON-документы рецептов пачками в нескольких'
+            ' процессах ')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--workers', type=int, default=multiprocessing.cpu_count(),
+            help='Число процессов, 1 - без них'
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        size = options['batch_size']
+        batches = [
+            recipe_ids[start:start + size]
+            for start in range(0, len(recipe_ids), size)
+        ]
+        workers = min(options['workers'], len(batches))
+        if workers <= 1:
+            done = sum(map(update_documents, batches))
+        else:
+            # Процессы-потомки не должны делить соединение с родителем.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork')
+            ) as executor:
+                done = sum(executor.map(rebuild_batch, batches))
+        self.stdout.write(self.style.SUCCESS(f'Собрано документов: {done}'))
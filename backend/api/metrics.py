@@ -0,0 +1,36 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from foodgram.metrics import registry
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def view_name(view_func, method):
+    """RecipeViewSet.list для вьюсетов, имя класса или функции иначе."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None)
+    if actions is None:
+        return view_class.__name__
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def metrics_view(request):
+    """Метрики для Prometheus, доступ по токену METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    # WSGI отдаёт заголовки строками latin-1, а compare_digest
+    # сравнивает только ASCII-строки, поэтому сравниваются байты.
+    try:
+        header = request.META.get('HTTP_AUTHORIZATION', '').encode('latin-1')
+    except UnicodeEncodeError:
+        raise Http404
+    if not token or not hmac.compare_digest(
+        header, f'Bearer {token}'.encode()
+    ):
+        raise Http404
+    return HttpResponse(registry.exposition(), content_type=CONTENT_TYPE)
@@ -1,5 +1,133 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ApproximateCountPaginator(Paginator):
+    """Число строк без фильтров берётся из статистики PostgreSQL."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+        return super().count
+
+
+class UncountedPage(Page):
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class UncountedPaginator(Paginator):
+    """Страница без COUNT(*): следующая есть, если нашлась лишняя строка."""
+
+    count = None
+
+    def page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidPage('Номер страницы должен быть числом')
+        if number < 1:
+            raise InvalidPage('Номер страницы меньше 1')
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise InvalidPage('Страница пуста')
+        return UncountedPage(
+            rows[:self.per_page], number, self, len(rows) > self.per_page
+        )
+
+
+class KeysetPagination(CursorPagination):
+    """Курсор по -id: OFFSET и COUNT(*) не нужны, новые записи не сдвигают
+    страницы."""
+
+    ordering = '-id'
+    page_size = 6
+    page_size_query_param = 'limit'
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = "limit"
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    # Курсор идёт только по id, с другим порядком он пропускал бы строки.
+    ordered_query_params = ('ordering', 'search')
+    count_paginators = {
+        'exact': Paginator,
+        'approximate': ApproximateCountPaginator,
+        'none': UncountedPaginator,
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_query_param in request.query_params:
+            ordered = [
+                param for param in self.ordered_query_params
+                if request.query_params.get(param)
+            ]
+            if ordered:
+                raise ValidationError({
+                    self.cursor_query_param:
+                        f'Курсор нельзя сочетать с {", ".join(ordered)}'
+                })
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.django_paginator_class = self.count_paginators.get(
+            request.query_params.get(self.count_query_param), Paginator
+        )
+        if self.django_paginator_class is not UncountedPaginator:
+            return super().paginate_queryset(queryset, request, view)
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        paginator = self.django_paginator_class(queryset, page_size)
+        try:
+            self.page = paginator.page(
+                request.query_params.get(self.page_query_param, 1)
+            )
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=request.query_params.get(self.page_query_param),
+                message=str(exc)
+            ))
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class CookPagination(PageNumberPagination):
+    """Страницы подбора по ингредиентам: подборка - не QuerySet, поэтому
+    курсор и способы подсчёта (cursor, count) здесь не действуют."""
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
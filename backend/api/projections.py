@@ -0,0 +1,161 @@
+from collections import defaultdict
+
+from api.user_state import get_user_state
+from recipes.models import IngredientRecipe, Recipe
+from recipes.search import rank_fields
+
+# Поля рецепта для списка: сам рецепт, автор одним JOIN и флаги
+# пользователя из with_user_flags.
+RECIPE_FIELDS = (
+    'id', 'name', 'image', 'image_variants', 'text', 'cooking_time',
+    'servings', 'favorites_count', 'in_carts_count', 'is_favorited',
+    'is_in_shopping_cart', 'author_id', 'author__username', 'author__email',
+    'author__first_name', 'author__last_name',
+)
+TAG_FIELDS = ('name', 'color', 'slug', 'id')
+USER_FIELDS = (
+    'username', 'email', 'first_name', 'last_name', 'id', 'recipes_count',
+    'subscribers_count',
+)
+
+
+def image_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def image_url(storage, name, request):
+    """Как serializers.ImageField: абсолютная ссылка, если есть request."""
+    if not name:
+        return None
+    url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def image_variants(storage, value, request):
+    """Как ImageVariantsField."""
+    return {
+        variant: {
+            extension: image_url(storage, name, request)
+            for extension, name in files.items()
+        }
+        for variant, files in value.items()
+    }
+
+
+def ingredient_list(ingredients):
+    """То же, что IngredientSerializer(many=True)."""
+    return [
+        {
+            'name': ingredient.name,
+            'id': ingredient.id,
+            'measurement_unit': ingredient.measurement_unit,
+        }
+        for ingredient in ingredients
+    ]
+
+
+def recipe_values(queryset):
+    """values() для списка рецептов, с рангом поиска, если он есть."""
+    return queryset.values(*RECIPE_FIELDS, *rank_fields(queryset))
+
+
+def recipe_list(rows, request):
+    """То же, что RecipeGetSerializer(many=True), из строк recipe_values.
+
+    Теги и ингредиенты страницы читаются двумя запросами values(), как
+    и в with_related, но без создания объектов моделей и полей DRF.
+    """
+    if not rows:
+        return []
+    ids = [row['id'] for row in rows]
+    tag_rows = Recipe.tags.through.objects.filter(
+        recipe_id__in=ids
+    ).order_by('tag_id').values_list(
+        'recipe_id', 'tag__name', 'tag__color', 'tag__slug', 'tag_id'
+    )
+    tags = defaultdict(list)
+    for recipe_id, name, color, slug, tag_id in tag_rows:
+        tags[recipe_id].append(
+            {'name': name, 'color': color, 'slug': slug, 'id': tag_id}
+        )
+    ingredient_rows = IngredientRecipe.objects.filter(
+        recipe_id__in=ids
+    ).order_by('id').values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    )
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id, name, unit, amount in ingredient_rows:
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': unit,
+            'amount': amount,
+        })
+    subscriptions = get_user_state(request).subscriptions
+    storage = image_storage()
+    return [
+        {
+            'id': row['id'],
+            'author': {
+                'username': row['author__username'],
+                'email': row['author__email'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'id': row['author_id'],
+                'is_subscribed': row['author_id'] in subscriptions,
+            },
+            'name': row['name'],
+            'image': image_url(storage, row['image'], request),
+            'image_variants': image_variants(
+                storage, row['image_variants'], request
+            ),
+            'text': row['text'],
+            'ingredients': ingredients[row['id']],
+            'tags': tags[row['id']],
+            'cooking_time': row['cooking_time'],
+            'servings': row['servings'],
+            'favorites_count': row['favorites_count'],
+            'in_carts_count': row['in_carts_count'],
+            'is_favorited': row['is_favorited'],
+            'is_in_shopping_cart': row['is_in_shopping_cart'],
+        }
+        for row in rows
+    ]
+
+
+def subscription_list(rows, recipes_limit):
+    """То же, что SubscribeSerializer(many=True), из строк values(USER_FIELDS).
+
+    Рецепты в подписках отдаются без request, с относительными ссылками.
+    """
+    recipes = defaultdict(list)
+    storage = image_storage()
+    for recipe in Recipe.objects.latest_by_author(
+        [row['id'] for row in rows], recipes_limit
+    ):
+        recipes[recipe.author_id].append({
+            'id': recipe.id,
+            'name': recipe.name,
+            'image': image_url(storage, recipe.image.name, None),
+            'image_variants': image_variants(
+                storage, recipe.image_variants, None
+            ),
+            'cooking_time': recipe.cooking_time,
+        })
+    return [
+        {
+            'username': row['username'],
+            'email': row['email'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'id': row['id'],
+            'is_subscribed': True,
+            'recipes_count': row['recipes_count'],
+            'subscribers_count': row['subscribers_count'],
+            'recipes': recipes[row['id']],
+        }
+        for row in rows
+    ]
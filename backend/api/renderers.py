@@ -0,0 +1,63 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен
+    orjson = None
+
+
+class Raw(str):
+    """Готовый фрагмент JSON, dumps вставляет его как есть."""
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer через orjson, если он установлен.
+
+    Вывод совпадает с JSONRenderer побайтно: компактные разделители,
+    UTF-8 без экранирования, даты и прочие типы - через кодировщик DRF.
+    С отступами и для того, что orjson не умеет, работает JSONRenderer.
+    Ответ из Raw уже отрисован и отдаётся как есть.
+    """
+
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, Raw):
+            return data.encode()
+        indent = self.get_indent(
+            accepted_media_type or '', renderer_context or {}
+        )
+        if (orjson is None or data is None or indent is not None
+                or self.ensure_ascii or not self.compact):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(
+                data,
+                default=self.encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как JSONRenderer: разделители строк JavaScript экранируются.
+        return content.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+def dumps(data):
+    """JSON как у FastJSONRenderer, с фрагментами Raw внутри."""
+    if isinstance(data, Raw):
+        return data
+    if isinstance(data, dict):
+        return '{' + ','.join(
+            f'{dumps(str(key))}:{dumps(value)}' for key, value in data.items()
+        ) + '}'
+    if isinstance(data, (list, tuple)):
+        return '[' + ','.join(map(dumps, data)) + ']'
+    if data is None:
+        return 'null'
+    return renderer.render(data).decode()
+
+
+renderer = FastJSONRenderer()
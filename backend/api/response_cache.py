@@ -0,0 +1,98 @@
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodgram.metrics import registry
+
+GENERATION_KEY = 'generation:{}'
+
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def bump_generation(model):
+    """Новое поколение модели делает недействительными все ответы с ней.
+
+    Поколение меняется ещё раз после фиксации транзакции, чтобы ответ,
+    собранный до неё по старым данным, не попал в кэш под новым ключом.
+    """
+    cache = response_cache()
+    key = GENERATION_KEY.format(model._meta.label_lower)
+    cache.set(key, uuid4().hex, None)
+    transaction.on_commit(lambda: cache.set(key, uuid4().hex, None))
+
+
+def not_modified(etag):
+    return Response(
+        status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag}
+    )
+
+
+def generations(models):
+    cache = response_cache()
+    keys = [GENERATION_KEY.format(model._meta.label_lower) for model in models]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, uuid4().hex, None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+class CachedResponseMixin:
+    """Кэш ответов list и retrieve.
+
+    Ключ складывается из хоста, пути, отсортированных параметров запроса и
+    поколений моделей из cache_models.
+    Если у вьюсета есть fast_list, список собирается им, без
+    сериализаторов (FAST_READ_PATH).
+    """
+
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        handler = super().list
+        if settings.FAST_READ_PATH and hasattr(self, 'fast_list'):
+            handler = self.fast_list
+        return self.cached_response(handler, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.response_cache_key(request)
+        etag = f'"{key.rsplit(":", 1)[-1]}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return not_modified(etag)
+        cache = response_cache()
+        data = cache.get(key)
+        registry.inc('foodgram_cache_requests_total', cache='response',
+                     result='miss' if data is None else 'hit')
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+        return Response(data, headers={'ETag': etag})
+
+    def response_cache_key(self, request):
+        query = urlencode(sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+        ), doseq=True)
+        raw = '|'.join((
+            request.get_host(), request.path, query,
+            *generations(self.cache_models),
+        ))
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        return f'response:{self.basename}:{self.action}:{digest}'
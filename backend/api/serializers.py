@@ -1,17 +1,29 @@
 # import re
+from collections import defaultdict
+
+from django.conf import settings
 from django.db import transaction
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import IntegerField, SerializerMethodField
 
-from api.fields import Base64ImageField, Hex2NameColor
+from api.fields import Base64ImageField, Hex2NameColor, ImageVariantsField
+from api.user_state import get_user_state
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientRecipe,
                             Recipe, ShoppingCart, Tag)
+from recipes.shopping_cart import invalidate_recipe_carts
 from users.models import Subscribe, User
 
 
+def recipes_limit(request):
+    limit = request.GET.get('recipes_limit')
+    if limit and limit.isdigit():
+        return int(limit)
+    return None
+
+
 class UsersCreateSerializer(UserCreateSerializer):
     class Meta:
         model = User
@@ -37,22 +49,29 @@ class UsersSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, object):
-        """Сработало только после описания случаев возврата false"""
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        subscriptions = self.context.get('subscriptions')
-        if subscriptions is None:
-            return False
-        if hasattr(object, 'id') and object.id is not None:
-            return object.id in subscriptions
-        return False
+        """Подписки загружаются один раз на запрос."""
+        state = get_user_state(self.context.get('request'))
+        return object.id in state.subscriptions
+
+
+class SubscribeListSerializer(serializers.ListSerializer):
+    """Рецепты всех авторов страницы одним оконным запросом."""
+
+    def to_representation(self, data):
+        authors = list(data)
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_author(
+            authors, self.child.get_recipes_limit()
+        ):
+            recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = recipes[author.id]
+        return super().to_representation(authors)
 
 
 class SubscribeSerializer(UserSerializer):
     """Сериализатор подписки."""
 
-    recipes_count = SerializerMethodField()
     recipes = SerializerMethodField()
     is_subscribed = SerializerMethodField()
 
@@ -66,8 +85,10 @@ class SubscribeSerializer(UserSerializer):
             'id',
             'is_subscribed',
             'recipes_count',
+            'subscribers_count',
             'recipes'
         )
+        list_serializer_class = SubscribeListSerializer
 
     def validate(self, data):
         author = self.instance
@@ -85,32 +106,22 @@ class SubscribeSerializer(UserSerializer):
         return data
 
     def get_is_subscribed(self, object):
-        """Сработало только после описания случаев возврата false"""
-        author = object
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        if Subscribe.objects.filter(author=author, user=user).exists():
-            return True
-        return False
-
-    def get_recipes_count(self, obj):
-        queryset = self.get_queryset(obj)
-        return queryset.count()
+        """Сериализатор отдаёт только авторов из подписок пользователя."""
+        return True
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = self.get_queryset(obj)
-        if limit:
-            queryset = queryset[:int(limit)]
+        if hasattr(obj, 'latest_recipes'):
+            queryset = obj.latest_recipes
+        else:
+            queryset = obj.recipe.order_by('-id')
+            limit = self.get_recipes_limit()
+            if limit is not None:
+                queryset = queryset[:limit]
         serializer = RecipeInfaSerializer(queryset, many=True, read_only=True)
         return serializer.data
 
-    def get_queryset(self, obj):
-        if hasattr(obj, 'recipes'):
-            return obj.recipes.all()
-        return Recipe.objects.filter(author=obj)
+    def get_recipes_limit(self):
+        return recipes_limit(self.context.get('request'))
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -158,7 +169,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             'name',
             'image',
             'text',
-            'cooking_time'
+            'cooking_time',
+            'servings'
         )
 
     def validate_ingredients(self, value):
@@ -167,14 +179,14 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise ValidationError({
                 'ingredients': 'Нужен хотя бы один ингредиент!'
             })
-        ingredients_list = []
+        found = Ingredient.objects.in_bulk(
+            {item['id'] for item in ingredients}
+        )
+        seen = set()
         for item in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=item['id'])
-            if not item:
-                raise ValidationError({
-                    'ingredients': 'Список пуст'
-                })
-            if ingredient in ingredients_list:
+            if item['id'] not in found:
+                raise Http404('Ингредиент не найден')
+            if item['id'] in seen:
                 raise ValidationError({
                     'ingredients': 'Ингридиенты должны быть уникальными'
                 })
@@ -182,19 +194,45 @@ class RecipeSerializer(serializers.ModelSerializer):
                 raise ValidationError({
                     'amount': 'Количество ингредиента должно быть больше 0'
                 })
-            ingredients_list.append(ingredient)
+            seen.add(item['id'])
         return value
 
     def create_ingredients(self, recipe, ingredients):
         IngredientRecipe.objects.bulk_create([
             IngredientRecipe(
                 recipe=recipe,
-                ingredient=Ingredient.objects.get(id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 amount=ingredient.get('amount'),
             )
             for ingredient in ingredients
         ])
 
+    def update_ingredients(self, recipe, ingredients):
+        """Меняет только добавленные, удалённые и изменённые строки."""
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        rows = {
+            row.ingredient_id: row
+            for row in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        removed = [
+            row.id for ingredient_id, row in rows.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            row = rows.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if removed:
+            IngredientRecipe.objects.filter(id__in=removed).delete()
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients(recipe, [
+            item for item in ingredients if item['id'] not in rows
+        ])
+        # bulk_create и bulk_update не отправляют сигналы.
+        invalidate_recipe_carts([recipe.id])
+
     def validate(self, data):
         request = self.context.get('request')
         if request and request.method == 'POST':
@@ -220,18 +258,23 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.get('tags')
-        validated_ingredients = validated_data.pop('ingredients')
-
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-
-        instance.tags.set(tags)
-        self.create_ingredients(instance, validated_ingredients)
-
+        validated_ingredients = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+        servings = instance.servings
+        instance = super().update(instance, validated_data)
+        if validated_ingredients is not None:
+            self.update_ingredients(instance, validated_ingredients)
+        elif instance.servings != servings:
+            invalidate_recipe_carts([instance.id])
         return instance
 
     def to_representation(self, instance):
-        context = {'request': self.context.get('request')}
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_flags(
+            request.user
+        ).get(id=instance.id)
+        context = {'request': request}
         return RecipeGetSerializer(instance, context=context).data
 
 
@@ -265,6 +308,7 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         source='ingredientrecipe_set',
         read_only=True
     )
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
@@ -275,30 +319,29 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             'author',
             'name',
             'image',
+            'image_variants',
             'text',
             'ingredients',
             'tags',
             'cooking_time',
+            'servings',
+            'favorites_count',
+            'in_carts_count',
             'is_favorited',
             'is_in_shopping_cart'
         )
 
     def get_is_favorited(self, obj):
-        return (
-            self.context.get('request').user.is_authenticated
-            and FavoriteRecipe.objects.filter(
-                user=self.context['request'].user,
-                recipe=obj
-            ).exists()
-        )
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        state = get_user_state(self.context.get('request'))
+        return obj.id in state.favorites
 
     def get_is_in_shopping_cart(self, obj):
-        return (
-            self.context.get('request').user.is_authenticated
-            and ShoppingCart.objects.filter(
-                user=self.context['request'].user,
-                recipe=obj).exists()
-        )
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        state = get_user_state(self.context.get('request'))
+        return obj.id in state.shopping_cart
 
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
@@ -347,14 +390,39 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         return RecipeInfaSerializer(instance.recipe, context=context).data
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для пакетных действий."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class CartServingsSerializer(serializers.ModelSerializer):
+    """Сериализатор порций рецепта в корзине."""
+
+    class Meta:
+        model = ShoppingCart
+        fields = ('recipe', 'servings')
+        read_only_fields = ('recipe',)
+
+
 class RecipeInfaSerializer(serializers.ModelSerializer):
     """Сериализатор информации о рецепте для списков."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
@@ -0,0 +1,99 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.documents import schedule_documents
+from api.response_cache import bump_generation
+from recipes.events import bulk_saved, image_variants_saved
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from users.models import User
+
+CACHED_MODELS = (Tag, Ingredient)
+
+
+def model_changed(sender, **kwargs):
+    bump_generation(sender)
+
+
+def token_deleted(sender, instance, **kwargs):
+    token_cache.revoke([instance.key])
+
+
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Смена пароля, блокировка и правка профиля сбрасывают снимок.
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    token_cache.revoke(Token.objects.filter(
+        user_id=instance.pk
+    ).values_list('key', flat=True))
+
+
+def recipe_document_changed(sender, instance, **kwargs):
+    schedule_documents([instance.id])
+
+
+def recipe_ingredients_document_changed(sender, instance, **kwargs):
+    schedule_documents([instance.recipe_id])
+
+
+def recipe_tags_document_changed(sender, instance, action, reverse,
+                                 pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            schedule_documents([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        schedule_documents(pk_set)
+    elif action == 'pre_clear':
+        schedule_documents(instance.recipe.values_list('id', flat=True))
+
+
+def recipe_images_document_changed(sender, recipe_ids, **kwargs):
+    schedule_documents(recipe_ids)
+
+
+def related_document_changed(sender, instance, created=False, **kwargs):
+    # Новый тег или ингредиент ещё не входит ни в один документ.
+    if created:
+        return
+    recipes = Recipe.objects.all()
+    if sender is Tag:
+        recipes = recipes.filter(tags=instance)
+    else:
+        recipes = recipes.filter(ingredientrecipe__ingredient=instance)
+    schedule_documents(recipes.values_list('id', flat=True))
+
+
+def bulk_document_changed(sender, objects, **kwargs):
+    schedule_documents(Recipe.objects.filter(
+        tags__in=[tag.pk for tag in objects if tag.pk]
+    ).values_list('id', flat=True))
+
+
+def author_document_changed(sender, instance, created,
+                            update_fields=None, **kwargs):
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    schedule_documents(Recipe.objects.filter(
+        author_id=instance.pk
+    ).values_list('id', flat=True))
+
+
+for model in CACHED_MODELS:
+    post_save.connect(model_changed, sender=model)
+    post_delete.connect(model_changed, sender=model)
+    bulk_saved.connect(model_changed, sender=model)
+post_delete.connect(token_deleted, sender=Token)
+post_save.connect(user_saved, sender=User)
+post_save.connect(recipe_document_changed, sender=Recipe)
+post_save.connect(recipe_ingredients_document_changed,
+                  sender=IngredientRecipe)
+post_delete.connect(recipe_ingredients_document_changed,
+                    sender=IngredientRecipe)
+m2m_changed.connect(recipe_tags_document_changed, sender=Recipe.tags.through)
+image_variants_saved.connect(recipe_images_document_changed)
+for model in (Tag, Ingredient):
+    post_save.connect(related_document_changed, sender=model)
+pre_delete.connect(related_document_changed, sender=Tag)
+bulk_saved.connect(bulk_document_changed, sender=Tag)
+post_save.connect(author_document_changed, sender=User)
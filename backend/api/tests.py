@@ -0,0 +1,303 @@
+import base64
+import random
+from io import BytesIO
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmark import (ENDPOINTS, ROWS, budget_failures, generate,
+                           pantry_query, reset_response_cache,
+                           response_size)
+from api.fields import decode_data_uri
+from api.paginations import CookPagination
+from recipes.counters import repair_counters
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientRecipe,
+                            Recipe, ShoppingCart)
+from recipes.pantry_index import pantry_index
+from users.models import Subscribe, User
+
+
+class CookPaginationTest(TestCase):
+    url = '/api/recipes/cook/'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru'
+        )
+        cls.salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        for number in range(8):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Посолить',
+                cooking_time=10, image='recipes/salt.jpg'
+            )
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=cls.salt, amount=1
+            )
+
+    def setUp(self):
+        # Индекс строится в памяти процесса, а данные теста новые.
+        pantry_index.invalidate()
+        self.client = APIClient()
+
+    def cook(self, **params):
+        response = self.client.get(
+            self.url, {'ingredients': self.salt.id, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_default_page_size(self):
+        data = self.cook()
+        self.assertEqual(data['count'], 8)
+        self.assertEqual(len(data['results']), 6)
+        self.assertIsNotNone(data['next'])
+
+    def test_limit_and_page(self):
+        data = self.cook(limit=3, page=3)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNone(data['next'])
+
+    def test_limit_is_capped(self):
+        with mock.patch.object(CookPagination, 'max_page_size', 4):
+            self.assertEqual(len(self.cook(limit=1000)['results']), 4)
+
+    def test_cursor_and_count_are_ignored(self):
+        for params in ({'cursor': 'x'}, {'count': 'approximate'},
+                       {'count': 'none'}):
+            with self.subTest(params=params):
+                data = self.cook(**params)
+                self.assertEqual(data['count'], 8)
+                self.assertEqual(len(data['results']), 6)
+
+
+class CursorPaginationTest(TestCase):
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru'
+        )
+        for number in range(3):
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10, image='recipes/recipe.jpg'
+            )
+
+    def test_cursor_pages_by_id(self):
+        response = self.client.get(self.url, {'cursor': '', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+
+    def test_cursor_with_ordering_is_rejected(self):
+        for params in ({'ordering': 'popular'}, {'search': 'рецепт'}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    self.url, {'cursor': '', **params}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json())
+
+
+@override_settings(METRICS_TOKEN='секрет')
+class MetricsViewTest(TestCase):
+    url = '/api/metrics'
+
+    def test_token_is_required(self):
+        for header in ('', 'Bearer чужой', 'Bearer \xe9', 'Bearer секрет'):
+            with self.subTest(header=header):
+                response = self.client.get(
+                    self.url, HTTP_AUTHORIZATION=header
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_non_ascii_token(self):
+        header = 'Bearer секрет'.encode().decode('latin-1')
+        response = self.client.get(self.url, HTTP_AUTHORIZATION=header)
+        self.assertEqual(response.status_code, 200)
+
+
+class TokenRevocationTest(TestCase):
+    me_url = '/api/users/me/'
+
+    def setUp(self):
+        self.user = User.objects.create(
+            username='user', email='user@foodgram.ru'
+        )
+
+    def authorized_client(self):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+        # Первый запрос кладёт пользователя в кэш токенов.
+        self.assertEqual(client.get(self.me_url).status_code, 200)
+        return client
+
+    def test_logout(self):
+        for enabled in (True, False):
+            with self.subTest(enabled=enabled), override_settings(
+                TOKEN_CACHE_ENABLED=enabled
+            ):
+                client = self.authorized_client()
+                self.assertEqual(
+                    client.post('/api/auth/token/logout/').status_code, 204
+                )
+                self.assertEqual(client.get(self.me_url).status_code, 401)
+
+    def test_deactivation(self):
+        for enabled in (True, False):
+            with self.subTest(enabled=enabled), override_settings(
+                TOKEN_CACHE_ENABLED=enabled
+            ):
+                client = self.authorized_client()
+                self.user.is_active = False
+                self.user.save()
+                self.assertEqual(client.get(self.me_url).status_code, 401)
+                self.user.is_active = True
+                self.user.save()
+                Token.objects.filter(user=self.user).delete()
+
+
+class QueryBudgetTest(TestCase):
+    """Бюджеты запросов benchmark_api на небольших данных."""
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(0)
+        cls.user, cls.recipe_id = generate({
+            'users': 60, 'recipes': 120, 'ingredients': 40,
+            'favorites': 300, 'carts': 200, 'subscriptions': 300,
+        })
+        cls.token = Token.objects.create(user=cls.user)
+        cls.pantry = pantry_query(cls.recipe_id)
+
+    def test_budgets(self):
+        client = APIClient()
+        for endpoint in ENDPOINTS:
+            with self.subTest(endpoint=endpoint.name):
+                if endpoint.auth:
+                    client.credentials(
+                        HTTP_AUTHORIZATION=f'Token {self.token.key}'
+                    )
+                else:
+                    client.credentials()
+                queries = {}
+                for rows in ROWS:
+                    # Каждый размер страницы - с пустыми кэшами.
+                    reset_response_cache(self.user)
+                    with CaptureQueriesContext(connection) as context:
+                        response = client.get(endpoint.url.format(
+                            rows=rows, recipe=self.recipe_id,
+                            pantry=self.pantry
+                        ))
+                        response_size(response)
+                    self.assertEqual(response.status_code, 200)
+                    queries[rows] = len(context)
+                self.assertEqual(budget_failures(endpoint, queries), [])
+
+
+class CountersApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@foodgram.ru'
+        )
+        cls.reader = User.objects.create(
+            username='reader', email='reader@foodgram.ru'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10, image='recipes/recipe.jpg'
+            ).id
+            for number in range(2)
+        ]
+        # Строки другого пользователя: лишнее вычитание не упрётся в ноль.
+        other = User.objects.create(
+            username='other', email='other@foodgram.ru'
+        )
+        Subscribe.objects.create(user=other, author=cls.author)
+        for recipe_id in cls.recipes:
+            FavoriteRecipe.objects.create(user=other, recipe_id=recipe_id)
+            ShoppingCart.objects.create(user=other, recipe_id=recipe_id)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def request(self, method, url, status, data=None):
+        response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status)
+        self.assertFalse(any(repair_counters(dry_run=True).values()))
+
+    def test_every_path_counts_once(self):
+        first, second = self.recipes
+        for name in ('favorite', 'shopping_cart'):
+            with self.subTest(name=name):
+                url = f'/api/recipes/{first}/{name}/'
+                bulk_url = f'/api/recipes/bulk_{name}/'
+                self.request('post', url, 201)
+                self.request('post', bulk_url, 200, {'ids': [first, second]})
+                self.request('delete', url, 204)
+                self.request('delete', bulk_url, 200, {'ids': [first, second]})
+                self.request('post', bulk_url, 200, {'ids': [second]})
+        author_url = f'/api/users/{self.author.id}/subscribe/'
+        self.request('post', author_url, 201)
+        self.request('delete', author_url, 204)
+        self.request(
+            'post', '/api/users/bulk_subscribe/', 200,
+            {'ids': [self.author.id]}
+        )
+        self.request(
+            'delete', '/api/users/bulk_subscribe/', 200,
+            {'ids': [self.author.id]}
+        )
+        self.client.force_authenticate(self.author)
+        self.request('delete', f'/api/recipes/{second}/', 204)
+
+
+class DecodeDataUriTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        image = BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(image, 'PNG')
+        cls.image = image.getvalue()
+        cls.encoded = base64.b64encode(cls.image).decode()
+
+    def decode(self, encoded):
+        # Маленькие части: границы попадают внутрь строк base64.
+        with mock.patch('api.fields.DECODE_CHUNK', 16):
+            return decode_data_uri(
+                f'data:image/png;base64,{encoded}'
+            ).read()
+
+    def test_wrapped_lines(self):
+        for separator in ('\n', '\r\n', ' '):
+            with self.subTest(separator=repr(separator)):
+                lines = [
+                    self.encoded[offset:offset + 76]
+                    for offset in range(0, len(self.encoded), 76)
+                ]
+                self.assertEqual(
+                    self.decode(separator.join(lines) + separator),
+                    self.image
+                )
+
+    def test_invalid_base64(self):
+        for encoded in (self.encoded[:-1], self.encoded[:20] + '!'):
+            with self.subTest(encoded=encoded[-8:]):
+                with self.assertRaises(serializers.ValidationError):
+                    self.decode(encoded)
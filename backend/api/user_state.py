@@ -0,0 +1,44 @@
+from django.utils.functional import cached_property
+
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Subscribe
+
+
+class UserState:
+    """Избранное, корзина и подписки пользователя.
+
+    Каждое множество загружается одним запросом при первом обращении,
+    для анонимного пользователя запросов нет.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def ids(self, model, field):
+        if self.user is None or not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(
+            model.objects.filter(user=self.user).values_list(field, flat=True)
+        )
+
+    @cached_property
+    def favorites(self):
+        return self.ids(FavoriteRecipe, 'recipe_id')
+
+    @cached_property
+    def shopping_cart(self):
+        return self.ids(ShoppingCart, 'recipe_id')
+
+    @cached_property
+    def subscriptions(self):
+        return self.ids(Subscribe, 'author_id')
+
+
+def get_user_state(request):
+    """Одно состояние пользователя на запрос."""
+    if request is None:
+        return UserState(None)
+    state = getattr(request, '_user_state', None)
+    if state is None:
+        state = request._user_state = UserState(request.user)
+    return state
@@ -1,28 +1,58 @@
-from datetime import datetime
+import hashlib
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import status, viewsets
+from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
 
-from api.filters import IngredientFilter, RecipeFilter
-from api.paginations import LimitPagination
+from api.documents import assemble, document_values
+from api.exports import SHOPPING_LIST_FORMATS
+from api.filters import RecipeFilter
+from api.paginations import (CookPagination, KeysetPagination,
+                             LimitPagination)
 from api.permissions import AuthorReadOnly
-from api.serializers import (IngredientSerializer, RecipeGetSerializer,
+from api.projections import (TAG_FIELDS, USER_FIELDS, ingredient_list,
+                             recipe_list, recipe_values, subscription_list)
+from api.renderers import FastJSONRenderer, Raw, dumps
+from api.response_cache import CachedResponseMixin, not_modified
+from api.serializers import (BulkIdsSerializer, CartServingsSerializer,
+                             IngredientSerializer, RecipeGetSerializer,
                              RecipeInfaSerializer, RecipeSerializer,
                              SubscribeSerializer, TagSerializer,
-                             UsersSerializer)
-from recipes.models import (FavoriteRecipe, Ingredient, IngredientRecipe,
-                            Recipe, ShoppingCart, Tag)
+                             UsersSerializer, recipes_limit)
+from recipes.counters import (change_counter, change_counters,
+                              counted_by_caller, lock_counters)
+from recipes.feed import feed_recipes, follow, unfollow
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from recipes.pantry_index import pantry_index
+from recipes.shopping_cart import (invalidate_carts,
+                                   shopping_cart_ingredients)
 from users.models import Subscribe, User
 
 
+def bulk_ids(request):
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
+
+
+def bulk_response(ids, statuses):
+    """Результат по каждому id в порядке запроса."""
+    return Response({'results': [
+        {'id': pk, 'status': statuses.get(pk, 'not_found')} for pk in ids
+    ]})
+
+
 class UsersViewSet(UserViewSet):
     """Вьюсет для создания/удаления подписки."""
 
@@ -41,31 +71,86 @@ class UsersViewSet(UserViewSet):
         author = get_object_or_404(User, id=author_id)
 
         if request.method == 'POST':
-            Subscribe.objects.create(user=user, author=author)
+            with transaction.atomic():
+                # Порядок блокировок тот же, что у bulk_follow.
+                lock_counters(User, [author.id, user.id])
+                Subscribe.objects.create(user=user, author=author)
+                user.refresh_from_db(fields=('subscriptions_count',))
+                follow(user, [author.id])
+            author.refresh_from_db(fields=('subscribers_count',))
             serializer = SubscribeSerializer(author,
                                              context={"request": request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            subscription = get_object_or_404(Subscribe,
-                                             user=user,
-                                             author=author)
-            subscription.delete()
+            with transaction.atomic():
+                # Подписка ищется после блокировки: параллельная отписка
+                # к этому времени уже видна.
+                lock_counters(User, [author.id, user.id])
+                subscription = get_object_or_404(Subscribe,
+                                                 user=user,
+                                                 author=author)
+                subscription.delete()
+                user.refresh_from_db(fields=('subscriptions_count',))
+                unfollow(user, [author.id])
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    def get_serializer_context(self):
-        if self.request.path == '/api/users/' and (
-            self.request.method == 'POST'
-        ):
-            return
-        context = super().get_serializer_context()
-        subscriptions = Subscribe.objects.filter(
-            user=self.request.user
-        ).values_list('author_id', flat=True)
-        context['subscriptions'] = set(subscriptions)
-        return context
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_subscribe(self, request):
+        """Подписка на несколько авторов или отписка от них."""
+        ids = bulk_ids(request)
+        user = request.user
+        if request.method == 'DELETE':
+            return bulk_response(ids, self.bulk_unsubscribe(user, ids))
+        return bulk_response(ids, self.bulk_follow(user, ids))
+
+    @transaction.atomic
+    def bulk_follow(self, user, ids):
+        lock_counters(User, [*ids, user.id])
+        authors = User.objects.filter(id__in=ids).annotate(
+            subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        ).values_list('id', 'subscribed')
+        statuses = {}
+        for author_id, subscribed in authors:
+            if author_id == user.id:
+                statuses[author_id] = 'self'
+            else:
+                statuses[author_id] = 'exists' if subscribed else 'created'
+        created = [pk for pk in ids if statuses.get(pk) == 'created']
+        if created:
+            Subscribe.objects.bulk_create(
+                [Subscribe(user=user, author_id=pk) for pk in created],
+                ignore_conflicts=True
+            )
+            change_counters(User, created, 'subscribers_count', 1)
+            change_counter(User, user.id, 'subscriptions_count', len(created))
+            user.refresh_from_db(fields=('subscriptions_count',))
+            follow(user, created)
+        return statuses
+
+    @transaction.atomic
+    def bulk_unsubscribe(self, user, ids):
+        # Блокировка ждёт параллельного удаления, затем видны только
+        # оставшиеся подписки.
+        lock_counters(User, [*ids, user.id])
+        subscriptions = Subscribe.objects.filter(user=user, author_id__in=ids)
+        deleted = list(subscriptions.values_list('author_id', flat=True))
+        if deleted:
+            with counted_by_caller():
+                subscriptions.filter(author_id__in=deleted).delete()
+            change_counters(User, deleted, 'subscribers_count', -1)
+            change_counter(User, user.id, 'subscriptions_count', -len(deleted))
+            user.refresh_from_db(fields=('subscriptions_count',))
+            unfollow(user, deleted)
+        return dict.fromkeys(deleted, 'deleted')
 
     @action(
         detail=False,
@@ -74,6 +159,8 @@ class UsersViewSet(UserViewSet):
     def subscriptions(self, request):
         user = request.user
         queryset = User.objects.filter(subscribing__user=user)
+        if settings.FAST_READ_PATH:
+            return self.fast_subscriptions(request, queryset)
         pages = self.paginate_queryset(queryset)
         if pages is not None:
             serializer = SubscribeSerializer(pages,
@@ -83,58 +170,214 @@ class UsersViewSet(UserViewSet):
         serializer = SubscribeSerializer(queryset,
                                          many=True,
                                          context={'request': request})
-        print(serializer.data)
         return Response(serializer.data)
 
+    def fast_subscriptions(self, request, queryset):
+        """subscriptions без сериализаторов."""
+        queryset = queryset.values(*USER_FIELDS)
+        limit = recipes_limit(request)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(subscription_list(list(queryset), limit))
+        return self.get_paginated_response(subscription_list(page, limit))
 
-class IngredientViewSet(viewsets.ModelViewSet):
+
+class IngredientViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """Вьюсет ингредиетов."""
 
     queryset = Ingredient.objects.all()
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = IngredientFilter
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     pagination_class = None
+    cache_models = (Ingredient,)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.search, request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '')
+        limit = request.query_params.get('limit', '')
+        if limit.isdigit():
+            limit = int(limit)
+        elif name:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        else:
+            limit = None
+        ingredients = ingredient_index.search(name, limit)
+        if settings.FAST_READ_PATH:
+            return Response(ingredient_list(ingredients))
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """Вьюсет тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
     pagination_class = None
+    cache_models = (Tag,)
+
+    def fast_list(self, request, *args, **kwargs):
+        return Response(list(self.get_queryset().values(*TAG_FIELDS)))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    """Вьюсет для создания/удаления рецептов, избранных и корзины."""
+    """Вьюсет для создания/удаления рецептов, избранных и корзины.
+
+    Кэш ответов здесь не нужен: JSON рецептов склеивается из готовых
+    документов RecipeDocument.
+    """
 
     queryset = Recipe.objects.all()
     permission_classes = [AuthorReadOnly]
     pagination_class = LimitPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    counters = {
+        FavoriteRecipe: 'favorites_count',
+        ShoppingCart: 'in_carts_count',
+    }
+
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            return Recipe.objects.with_related().with_user_flags(
+                self.request.user
+            )
+        return Recipe.objects.all()
+
+    def fast_list(self, request, *args, **kwargs):
+        """list без сериализаторов: страница строк values() в словари."""
+        queryset = recipe_values(self.filter_queryset(
+            Recipe.objects.with_user_flags(request.user)
+        ))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(recipe_list(list(queryset), request))
+        return self.get_paginated_response(recipe_list(page, request))
+
+    def use_documents(self, request):
+        """JSON рецептов собирается из документов RecipeDocument."""
+        return (
+            settings.FAST_READ_PATH and settings.RECIPE_DOCUMENTS
+            and isinstance(request.accepted_renderer, FastJSONRenderer)
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_documents(request):
+            if settings.FAST_READ_PATH:
+                return self.fast_list(request, *args, **kwargs)
+            return super().list(request, *args, **kwargs)
+        queryset = document_values(self.filter_queryset(
+            Recipe.objects.with_user_flags(request.user)
+        ))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            response = Response(assemble(queryset, request))
+        else:
+            response = self.get_paginated_response(assemble(page, request))
+        return self.document_response(request, response)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_documents(request):
+            return super().retrieve(request, *args, **kwargs)
+        queryset = document_values(self.filter_queryset(
+            Recipe.objects.with_user_flags(request.user)
+        ))
+        row = generics.get_object_or_404(queryset, pk=kwargs['pk'])
+        return self.document_response(
+            request, Response(assemble([row], request)[0])
+        )
+
+    def document_response(self, request, response):
+        """Ответ отрисовывается сразу; анонимным - с ETag."""
+        response.data = Raw(dumps(response.data))
+        if request.user.is_authenticated:
+            return response
+        etag = f'"{hashlib.md5(response.data.encode()).hexdigest()}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return not_modified(etag)
+        response['ETag'] = etag
+        return response
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeGetSerializer
         return RecipeSerializer
 
-    def valid_create(self, model, user, pk):
+    @transaction.atomic
+    def valid_create(self, model, user, pk, **fields):
+        lock_counters(Recipe, [pk])
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        model.objects.create(user=user, recipe=recipe, **fields)
         serializer = RecipeInfaSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_from(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        lock_counters(Recipe, [pk])
+        deleted, _ = model.objects.filter(user=user, recipe__id=pk).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепт уже удален'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
+    def bulk_create_for(self, model, user, ids):
+        """Добавляет рецепты пачкой; уже добавленные пропускаются."""
+        lock_counters(Recipe, ids)
+        recipes = Recipe.objects.filter(id__in=ids).annotate(
+            added=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        ).values_list('id', 'added')
+        statuses = {
+            recipe_id: 'exists' if added else 'created'
+            for recipe_id, added in recipes
+        }
+        created = [pk for pk in ids if statuses.get(pk) == 'created']
+        if created:
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in created],
+                ignore_conflicts=True
+            )
+            change_counters(Recipe, created, self.counters[model], 1)
+            if model is ShoppingCart:
+                # bulk_create не отправляет сигналы.
+                invalidate_carts([user.id])
+        return statuses
+
+    @transaction.atomic
+    def bulk_delete_from(self, model, user, ids):
+        # Блокировка ждёт параллельного удаления, затем видны только
+        # оставшиеся строки.
+        lock_counters(Recipe, ids)
+        rows = model.objects.filter(user=user, recipe_id__in=ids)
+        deleted = list(rows.values_list('recipe_id', flat=True))
+        if deleted:
+            with counted_by_caller():
+                rows.filter(recipe_id__in=deleted).delete()
+            change_counters(Recipe, deleted, self.counters[model], -1)
+        return dict.fromkeys(deleted, 'deleted')
+
+    def bulk_action(self, request, model):
+        ids = bulk_ids(request)
+        if request.method == 'DELETE':
+            statuses = self.bulk_delete_from(model, request.user, ids)
+        else:
+            statuses = self.bulk_create_for(model, request.user, ids)
+        return bulk_response(ids, statuses)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        lock_counters(User, [instance.author_id])
+        # Счётчики самого рецепта удаляются вместе с ним, и каскадное
+        # удаление избранного и корзин их не трогает.
+        with counted_by_caller():
+            instance.delete()
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
     @action(
         methods=['post', 'delete'],
         permission_classes=[IsAuthenticated],
@@ -147,15 +390,110 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.delete_from(FavoriteRecipe, request.user, pk)
 
     @action(
-        methods=['post', 'delete'],
+        methods=['post', 'patch', 'delete'],
         permission_classes=[IsAuthenticated],
         detail=True
     )
     def shopping_cart(self, request, pk):
-        if request.method == 'POST':
-            return self.valid_create(ShoppingCart, request.user, pk)
+        """Рецепт в корзине; servings - сколько порций купить."""
+        if request.method == 'DELETE':
+            return self.delete_from(ShoppingCart, request.user, pk)
+        if request.method == 'PATCH':
+            item = get_object_or_404(
+                ShoppingCart, user=request.user, recipe_id=pk
+            )
+            serializer = CartServingsSerializer(item, data=request.data)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return Response(serializer.data)
+        serializer = CartServingsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.valid_create(
+            ShoppingCart, request.user, pk, **serializer.validated_data
+        )
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_favorite(self, request):
+        """Несколько рецептов в избранное или из избранного."""
+        return self.bulk_action(request, FavoriteRecipe)
 
-        return self.delete_from(ShoppingCart, request.user, pk)
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_shopping_cart(self, request):
+        """Несколько рецептов в корзину или из корзины."""
+        return self.bulk_action(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        url_path='shopping_cart',
+        url_name='shopping-list',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_list(self, request):
+        """Список покупок корзины в JSON, как в скачиваемом файле."""
+        return Response(shopping_cart_ingredients(request.user))
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми, по курсору."""
+        queryset = self.filter_queryset(
+            feed_recipes(request.user).with_related().with_user_flags(
+                request.user
+            )
+        )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, pagination_class=CookPagination)
+    def cook(self, request):
+        """Рецепты из имеющихся ингредиентов (ingredients): сначала те,
+        которым недостаёт меньше ингредиентов, не больше max_missing."""
+        try:
+            ingredients = [
+                int(value)
+                for value in request.query_params.getlist('ingredients')
+            ]
+            max_missing = request.query_params.get('max_missing')
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            return Response(
+                {'errors': 'ingredients и max_missing - целые числа'},
+                status=HTTP_400_BAD_REQUEST
+            )
+        page = self.paginate_queryset(
+            pantry_index.match(ingredients, max_missing)
+        )
+        return self.get_paginated_response(self.matched_recipes(page))
+
+    def matched_recipes(self, matches):
+        """Рецепты с числом недостающих ингредиентов и долей имеющихся.
+
+        Рецепт, удалённый после обновления индекса, пропускается.
+        """
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for _, _, recipe_id in matches]
+        )
+        matches = [item for item in matches if item[2] in recipes]
+        data = self.get_serializer(
+            [recipes[recipe_id] for _, _, recipe_id in matches], many=True
+        ).data
+        for item, (missing, found, _) in zip(data, matches):
+            item['missing_count'] = missing
+            item['coverage'] = round(found / (found + missing), 2)
+        return data
 
     @action(
         detail=False,
@@ -163,31 +501,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         user = request.user
+        file_format = request.query_params.get('type', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                 + ', '.join(SHOPPING_LIST_FORMATS)},
+                status=HTTP_400_BAD_REQUEST
+            )
         if not user.shopping_cart.exists():
             return Response(status=HTTP_400_BAD_REQUEST)
 
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-
-        today = datetime.today()
-        shopping_list = (
-            f'Список покупок для: {user.get_full_name()}\n\n'
-            f'Дата: {today:%Y-%m-%d}\n\n'
+        content_type, render = SHOPPING_LIST_FORMATS[file_format]
+        filename = f'{user.username}_shopping_list.{file_format}'
+        response = StreamingHttpResponse(
+            render(user, shopping_cart_ingredients(user)),
+            content_type=f'{content_type}; charset=utf-8'
         )
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        shopping_list += f'\n\nFoodgram ({today:%Y})'
-
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
         response['Content-Disposition'] = f'attachment; filename={filename}'
 
         return response
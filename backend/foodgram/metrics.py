@@ -0,0 +1,263 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# Имя -> (тип, описание, границы корзин гистограммы).
+METRICS = {
+    'foodgram_requests_total': (
+        'counter', 'Запросы по представлению, методу и коду ответа', None
+    ),
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Время ответа по представлению и методу',
+        LATENCY_BUCKETS
+    ),
+    'foodgram_request_queries': (
+        'histogram', 'Запросов к базе на ответ (замеренные ответы)',
+        QUERY_BUCKETS
+    ),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кэшам: попадания и промахи', None
+    ),
+    'foodgram_image_bytes_decoded_total': (
+        'counter', 'Байт пикселей раскодировано из фото рецептов', None
+    ),
+}
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{escape(value)}"' for name, value in pairs
+    ) + '}'
+
+
+def format_bound(bound):
+    return repr(float(bound))
+
+
+# Сумма файлов завершившихся процессов, её пишет только мастер gunicorn.
+EXITED = 'exited.json'
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(path, snapshot):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(temporary, path)
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def merge(snapshots):
+    """Сумма снимков по имени метрики и меткам."""
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', ()):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot.get('histograms', ()):
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+
+def as_snapshot(counters, histograms):
+    return {
+        'counters': [
+            [name, labels, value]
+            for (name, labels), value in counters.items()
+        ],
+        'histograms': [
+            [name, labels, list(counts), total]
+            for (name, labels), (counts, total) in histograms.items()
+        ],
+    }
+
+
+def clean_directory():
+    """Удалить файлы прошлого запуска; мастер gunicorn вызывает это при
+    старте, до появления процессов."""
+    if settings.METRICS_DIR:
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json*')):
+            remove(path)
+
+
+def compact(pid):
+    """Сложить файлы завершившегося процесса pid в EXITED и удалить их.
+
+    В EXITED перечислены сложенные файлы: пока они не удалены, collect
+    их пропускает и не считает значения дважды.
+    """
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    exited_path = os.path.join(directory, EXITED)
+    exited = read_snapshot(exited_path) or {}
+    merged = [
+        name for name in exited.get('merged', ())
+        if os.path.exists(os.path.join(directory, name))
+    ]
+    paths = [
+        path for path in glob.glob(os.path.join(directory, f'{pid}-*.json'))
+        if os.path.basename(path) not in merged
+    ]
+    if not paths:
+        return
+    snapshots = [exited, *filter(None, map(read_snapshot, paths))]
+    write_snapshot(exited_path, {
+        **as_snapshot(*merge(snapshots)),
+        'merged': merged + [os.path.basename(path) for path in paths],
+    })
+    for path in paths + glob.glob(os.path.join(directory, f'{pid}-*.tmp')):
+        remove(path)
+
+
+class Registry:
+    """Счётчики и гистограммы процесса.
+
+    Процесс раз в METRICS_FLUSH_INTERVAL секунд записывает свои значения
+    в отдельный файл в METRICS_DIR, а /api/metrics складывает файлы всех
+    процессов gunicorn, в том числе завершившихся: значения только
+    растут, поэтому сумма остаётся верной. Файлы завершившихся процессов
+    мастер складывает в один (compact), при старте каталог очищается.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._flushed = 0.0
+        self._name = uuid4().hex
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [
+                    [0] * (len(buckets) + 1), 0.0
+                ]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return as_snapshot(self._counters, self._histograms)
+
+    @property
+    def path(self):
+        # pid отличает процессы, разветвлённые после импорта модуля.
+        return os.path.join(
+            settings.METRICS_DIR, f'{os.getpid()}-{self._name}.json'
+        )
+
+    def flush(self, force=False):
+        """Записать значения процесса в файл, не чаще интервала."""
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._flushed = now
+        write_snapshot(self.path, self.snapshot())
+
+    def collect(self):
+        """Сумма значений этого процесса и файлов остальных."""
+        snapshots = [self.snapshot()]
+        if settings.METRICS_DIR:
+            pattern = os.path.join(settings.METRICS_DIR, '*.json')
+            # EXITED читается последним: файл процесса, сложенный в него
+            # после чтения, пропускается по списку merged, а удалённый до
+            # чтения уже учтён в EXITED.
+            paths = sorted(
+                glob.glob(pattern),
+                key=lambda path: os.path.basename(path) == EXITED
+            )
+            files = {}
+            for path in paths:
+                if path != self.path:
+                    snapshot = read_snapshot(path)
+                    if snapshot is not None:
+                        files[os.path.basename(path)] = snapshot
+            merged = set(files.get(EXITED, {}).get('merged', ()))
+            snapshots += [
+                snapshot for name, snapshot in files.items()
+                if name not in merged
+            ]
+        return merge(snapshots)
+
+    def exposition(self):
+        """Все метрики в текстовом формате Prometheus."""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, description, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            for (metric, labels), (counts, total) in sorted(
+                histograms.items()
+            ):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip((*buckets, '+Inf'), counts):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else format_bound(bound)
+                    lines.append(
+                        f'{name}_bucket'
+                        f'{format_labels(labels, (("le", le),))} {cumulative}'
+                    )
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(
+                    f'{name}_count{format_labels(labels)} {cumulative}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -60,6 +60,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -113,6 +114,72 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+
+INGREDIENT_SEARCH_LIMIT = 20
+
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', default='default')
+
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', default=10 * 1024 * 1024)
+)
+
+# Списки рецептов, тегов, ингредиентов и подписок собираются из values()
+# без сериализаторов; 0 - через сериализаторы.
+FAST_READ_PATH = os.getenv('FAST_READ_PATH', default='1') == '1'
+# JSON списка и страницы рецепта склеивается из готовых документов
+# RecipeDocument (при включённом FAST_READ_PATH).
+RECIPE_DOCUMENTS = os.getenv('RECIPE_DOCUMENTS', default='1') == '1'
+
+# Доля запросов с замером времени и запросов к базе (Server-Timing);
+# замер перехватывает каждый SQL, поэтому по умолчанию это 1% запросов.
+INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv('INSTRUMENTATION_SAMPLE_RATE', default=0.01)
+)
+# Замеренные запросы дольше этого, мс, пишутся в журнал.
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', default=500))
+# Столько одинаковых SQL в одном запросе - признак N+1, пишется в журнал.
+DUPLICATE_QUERY_THRESHOLD = int(
+    os.getenv('DUPLICATE_QUERY_THRESHOLD', default=10)
+)
+
+# Метрики Prometheus на /api/metrics; без токена адрес отключён.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+# Каталог, через который складываются метрики процессов gunicorn.
+METRICS_DIR = os.getenv('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = 5
+
+# Снимки пользователей по токенам: сколько хранит процесс и как долго.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=10000))
+TOKEN_CACHE_TIMEOUT = 60 * 5
+# Отзыв токена доходит до других процессов только через общий кэш,
+# с кэшем в памяти процесса токен проверяется по базе.
+TOKEN_CACHE_ENABLED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Сколько id можно передать в одном пакетном запросе.
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', default=100))
+
+# С этого числа подписок лента пользователя хранится в таблице, 0 - никогда.
+FEED_MATERIALIZE_FROM = int(os.getenv('FEED_MATERIALIZE_FROM', default=200))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -170,7 +237,11 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
     'DEFAULT_PAGINATION_CLASS':
         'api.paginations.LimitPagination',
@@ -0,0 +1,21 @@
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def on_starting(server):
+    from foodgram.metrics import clean_directory
+
+    clean_directory()
+
+
+def worker_exit(server, worker):
+    from foodgram.metrics import registry
+
+    registry.flush(force=True)
+
+
+def child_exit(server, worker):
+    from foodgram.metrics import compact
+
+    compact(worker.pid)
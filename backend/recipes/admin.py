@@ -2,6 +2,7 @@ from django.contrib.admin import ModelAdmin, register
 
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientRecipe,
                             Recipe, ShoppingCart, Tag)
+from recipes.search import search_recipes
 
 
 @register(Ingredient)
@@ -25,9 +26,16 @@ class RecipeAdmin(ModelAdmin):
         return ' '.join(tag)
     tags.short_description = 'Tag'
 
-    list_display = ('name', 'author', 'tags')
+    list_display = (
+        'name', 'author', 'tags', 'favorites_count', 'in_carts_count'
+    )
     search_fields = ('name',)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
+
 
 @register(IngredientRecipe)
 class IngredientRecipeAdmin(ModelAdmin):
@@ -41,4 +49,4 @@ class FavoriteRecipeAdmin(ModelAdmin):
 
 @register(ShoppingCart)
 class ShoppingCartAdmin(ModelAdmin):
-    list_display = ('recipe', 'user')
+    list_display = ('recipe', 'user', 'servings')
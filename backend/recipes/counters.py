@@ -0,0 +1,114 @@
+import threading
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# Модель со счётчиком, поле счётчика, модель считаемых строк и её поле,
+# ссылающееся на первую модель.
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.FavoriteRecipe', 'recipe'),
+    ('recipes.Recipe', 'in_carts_count', 'recipes.ShoppingCart', 'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'subscribers_count', 'users.Subscribe', 'author'),
+    ('users.User', 'subscriptions_count', 'users.Subscribe', 'user'),
+)
+
+_state = threading.local()
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счётчик на delta, не опуская его ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def change_counters(model, pks, field, delta):
+    """change_counter для нескольких строк одним запросом."""
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def lock_counters(model, pks):
+    """Блокирует строки со счётчиками до конца транзакции.
+
+    Запросы, которые добавляют строки-источники, сначала блокируют
+    строки счётчиков, а потом проверяют, что уже добавлено: проверка
+    видит всё, что добавил параллельный запрос. Порядок по pk не даёт
+    запросам ждать друг друга по кругу.
+    """
+    list(model.objects.select_for_update().filter(
+        pk__in=pks
+    ).order_by('pk').values_list('pk', flat=True))
+
+
+@contextmanager
+def counted_by_caller():
+    """Внутри блока сохранение и удаление строк не меняют счётчики.
+
+    Пакетные операции меняют счётчики сами, одним запросом на счётчик,
+    а удаление рецепта не трогает его собственные счётчики.
+    """
+    depth = getattr(_state, 'depth', 0)
+    _state.depth = depth + 1
+    try:
+        yield
+    finally:
+        _state.depth = depth
+
+
+def count_row(instance, delta):
+    """Меняет на delta счётчики, которые считают строку instance.
+
+    Вызывается из сигналов: счётчики следуют и за правками в админке, и
+    за каскадным удалением. Строки счётчиков блокируются lock_counters.
+    """
+    if getattr(_state, 'depth', 0):
+        return
+    targets = {}
+    for label, field, rows_label, relation in COUNTERS:
+        if rows_label == instance._meta.label:
+            pk = getattr(instance, f'{relation}_id')
+            targets.setdefault(label, []).append((pk, field))
+    for label, changes in targets.items():
+        model = apps.get_model(label)
+        lock_counters(model, [pk for pk, _ in changes])
+        for pk, field in changes:
+            change_counter(model, pk, field, delta)
+
+
+def actual_count(rows, relation):
+    return Coalesce(Subquery(
+        rows.objects.filter(**{relation: OuterRef('pk')})
+        .order_by()
+        .values(relation)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def repair_counters(models=None, dry_run=False):
+    """Пересчитывает счётчики по строкам-источникам.
+
+    Обновляются только строки с неверным значением, по одному запросу
+    UPDATE на счётчик. Возвращает число таких строк по каждому счётчику.
+    """
+    fixed = {}
+    for label, field, rows_label, relation in COUNTERS:
+        if models is not None and label not in models:
+            continue
+        model = apps.get_model(label)
+        actual = actual_count(apps.get_model(rows_label), relation)
+        wrong = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        )
+        if dry_run:
+            fixed[f'{label}.{field}'] = wrong.count()
+        else:
+            fixed[f'{label}.{field}'] = model.objects.filter(
+                pk__in=wrong.values('pk')
+            ).update(**{field: actual})
+    return fixed
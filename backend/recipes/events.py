@@ -0,0 +1,11 @@
+from django.dispatch import Signal
+
+# Сигналы об изменениях в обход save(): на них подписываются другие
+# приложения, а recipes о подписчиках не знает.
+
+# Сохранены уменьшенные копии фото; recipe_ids - id рецептов.
+image_variants_saved = Signal()
+
+# Объекты objects модели sender записаны через bulk_create или
+# bulk_update.
+bulk_saved = Signal()
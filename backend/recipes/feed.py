@@ -0,0 +1,100 @@
+from itertools import islice
+
+from django.conf import settings
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscribe, User
+
+BATCH_SIZE = 1000
+
+
+def materialized(user):
+    """Лента хранится в таблице, если подписок не меньше порога."""
+    threshold = settings.FEED_MATERIALIZE_FROM
+    return bool(threshold) and user.subscriptions_count >= threshold
+
+
+def feed_recipes(user):
+    """Рецепты авторов, на которых подписан пользователь."""
+    if materialized(user):
+        return Recipe.objects.filter(feed_entries__user=user)
+    return Recipe.objects.filter(author_id__in=Subscribe.objects.filter(
+        user=user
+    ).values('author_id'))
+
+
+def write_entries(pairs, batch_size=BATCH_SIZE):
+    """Пары (пользователь, рецепт) в таблицу лент пачками."""
+    pairs = iter(pairs)
+    while True:
+        batch = [
+            FeedEntry(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in islice(pairs, batch_size)
+        ]
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """Новый рецепт в хранимые ленты подписчиков автора."""
+    threshold = settings.FEED_MATERIALIZE_FROM
+    if not threshold:
+        return
+    subscribers = Subscribe.objects.filter(
+        author_id=recipe.author_id, user__subscriptions_count__gte=threshold
+    ).values_list('user_id', flat=True)
+    write_entries((
+        (user_id, recipe.id) for user_id in subscribers.iterator()
+    ))
+
+
+def follow(user, author_ids):
+    """Подписка: рецепты авторов в ленту, при переходе порога - вся лента.
+
+    subscriptions_count пользователя уже должен учитывать подписки.
+    """
+    if not materialized(user):
+        return
+    authors = author_ids
+    previous = user.subscriptions_count - len(author_ids)
+    if previous < settings.FEED_MATERIALIZE_FROM:
+        authors = Subscribe.objects.filter(user=user).values('author_id')
+    recipes = Recipe.objects.filter(
+        author_id__in=authors
+    ).values_list('id', flat=True)
+    write_entries((
+        (user.id, recipe_id) for recipe_id in recipes.iterator()
+    ))
+
+
+def unfollow(user, author_ids):
+    """Отписка: рецепты авторов из ленты, ниже порога - вся лента."""
+    entries = FeedEntry.objects.filter(user=user)
+    if materialized(user):
+        entries = entries.filter(recipe__author_id__in=author_ids)
+    entries.delete()
+
+
+def rebuild_feeds(batch_size=BATCH_SIZE):
+    """Заново заполняет хранимые ленты.
+
+    Возвращает число пользователей, чьи ленты хранятся в таблице.
+    """
+    FeedEntry.objects.all().delete()
+    threshold = settings.FEED_MATERIALIZE_FROM
+    if not threshold:
+        return 0
+    user_ids = list(User.objects.filter(
+        subscriptions_count__gte=threshold
+    ).values_list('id', flat=True))
+    for user_id in user_ids:
+        recipes = Recipe.objects.filter(
+            author_id__in=Subscribe.objects.filter(
+                user_id=user_id
+            ).values('author_id')
+        ).values_list('id', flat=True)
+        write_entries((
+            (user_id, recipe_id) for recipe_id in recipes.iterator()
+        ), batch_size)
+    return len(user_ids)
@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from foodgram.metrics import registry
+from recipes.events import image_variants_saved
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Вписать в квадрат со стороной, px: карточка списка, страница рецепта,
+# страница рецепта на экранах с двойной плотностью.
+VARIANTS = {
+    'card': 480,
+    'detail': 1080,
+    'retina': 2160,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images'
+) if settings.IMAGE_WORKERS else None
+# Декодирование в потоках запросов тоже ограничено числом воркеров.
+decode_slots = threading.BoundedSemaphore(max(settings.IMAGE_WORKERS, 1))
+
+
+def render(image, size, file_format, options):
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    if file_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(buffer, file_format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(field_file):
+    """Уменьшенные копии изображения во всех размерах и форматах."""
+    storage = field_file.storage
+    directory = os.path.dirname(field_file.name)
+    with field_file.open('rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    registry.inc('foodgram_image_bytes_decoded_total',
+                 image.width * image.height * len(image.getbands()))
+    variants = {}
+    for variant, size in VARIANTS.items():
+        variants[variant] = {
+            extension: storage.save(
+                f'{directory}/variants/{variant}.{extension}',
+                ContentFile(render(image, size, file_format, options))
+            )
+            for extension, (file_format, options) in FORMATS.items()
+        }
+    return variants
+
+
+def process_recipe_image(recipe_id, name):
+    recipe = Recipe.objects.filter(id=recipe_id, image=name).first()
+    if recipe is None:
+        return
+    variants = build_variants(recipe.image)
+    # Фото могли заменить, пока создавались копии.
+    if Recipe.objects.filter(id=recipe_id, image=name).update(
+        image_variants=variants
+    ):
+        image_variants_saved.send(sender=Recipe, recipe_ids=[recipe_id])
+
+
+def process_safely(recipe_id, name):
+    try:
+        process_recipe_image(recipe_id, name)
+    except Exception:
+        logger.exception('Не удалось обработать фото рецепта %s', recipe_id)
+
+
+def run_in_worker(recipe_id, name):
+    try:
+        process_safely(recipe_id, name)
+    finally:
+        connections.close_all()
+
+
+def schedule_recipe_image(recipe):
+    """Копии создаются в пуле потоков после фиксации транзакции.
+
+    При IMAGE_WORKERS = 0 обработка идёт сразу, в потоке запроса.
+    """
+    recipe_id, name = recipe.id, recipe.image.name
+    if executor is None:
+        transaction.on_commit(lambda: process_safely(recipe_id, name))
+    else:
+        transaction.on_commit(
+            lambda: executor.submit(run_in_worker, recipe_id, name)
+        )
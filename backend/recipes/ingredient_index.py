@@ -0,0 +1,174 @@
+import threading
+from bisect import bisect_left, bisect_right
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Ingredient
+
+VERSION_KEY = 'ingredient_index_version'
+FUZZY_MIN_LENGTH = 3
+SEPARATOR = '\n'
+
+
+def edit_distance(first, second):
+    """Расстояние Левенштейна: число вставок, удалений и замен."""
+    previous = list(range(len(second) + 1))
+    for index, char in enumerate(first, 1):
+        current = [index]
+        for other_index, other in enumerate(second, 1):
+            current.append(min(
+                previous[other_index] + 1,
+                current[-1] + 1,
+                previous[other_index - 1] + (char != other),
+            ))
+        previous = current
+    return previous[-1]
+
+
+class TrieNode:
+    """Узел префиксного дерева с диапазоном ключей в отсортированном
+    массиве: все названия поддерева лежат в keys[start:end]."""
+
+    __slots__ = ('children', 'start', 'end')
+
+    def __init__(self, start):
+        self.children = {}
+        self.start = start
+        self.end = start + 1
+
+
+class Snapshot:
+    """Неизменяемый срез каталога ингредиентов."""
+
+    def __init__(self, ingredients):
+        self.ingredients = sorted(
+            ingredients, key=lambda item: (item.name.casefold(), item.id)
+        )
+        self.keys = [item.name.casefold() for item in self.ingredients]
+        self.text = SEPARATOR.join(self.keys)
+        self.offsets = []
+        offset = 0
+        for key in self.keys:
+            self.offsets.append(offset)
+            offset += len(key) + len(SEPARATOR)
+        self.root = TrieNode(0)
+        self.root.end = len(self.keys)
+        for position, key in enumerate(self.keys):
+            node = self.root
+            for char in key:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = TrieNode(position)
+                child.end = position + 1
+                node = child
+
+    def prefix(self, query):
+        upper = query[:-1] + chr(ord(query[-1]) + 1)
+        return range(
+            bisect_left(self.keys, query), bisect_left(self.keys, upper)
+        )
+
+    def contains(self, query):
+        """Позиции названий с подстрокой query, кроме начала названия."""
+        found = []
+        offset = self.text.find(query, 1)
+        while offset != -1:
+            position = bisect_right(self.offsets, offset) - 1
+            if offset != self.offsets[position]:
+                found.append(position)
+            if position + 1 == len(self.offsets):
+                break
+            offset = self.text.find(
+                query, max(offset + 1, self.offsets[position + 1] + 1)
+            )
+        return found
+
+    def fuzzy(self, query):
+        """Позиции названий, начало которых отличается от query на одну
+        вставку, удаление или замену символа: ближайшие к query целиком
+        первыми, при равенстве - по алфавиту."""
+        found = set()
+        self._walk(self.root, query, 0, False, found)
+        return sorted(found, key=lambda position: (
+            edit_distance(query, self.keys[position]), position
+        ))
+
+    def _walk(self, node, query, index, edited, found):
+        if index == len(query):
+            if edited:
+                found.update(range(node.start, node.end))
+            return
+        char = query[index]
+        child = node.children.get(char)
+        if child is not None:
+            self._walk(child, query, index + 1, edited, found)
+        if edited:
+            return
+        self._walk(node, query, index + 1, True, found)
+        for other, child in node.children.items():
+            if other != char:
+                self._walk(child, query, index + 1, True, found)
+            self._walk(child, query, index, True, found)
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся отсортированным массивом в casefold, поэтому
+    префиксный поиск - это два бинарных поиска, а опечатки ищутся обходом
+    префиксного дерева с бюджетом в одну правку. Изменение ингредиентов
+    меняет версию в общем кэше, и каждый процесс перестраивает свою копию
+    при следующем запросе.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = None
+
+    def invalidate(self):
+        """Новая версия сейчас и ещё раз после фиксации транзакции, чтобы
+        срез, загруженный до неё, не остался под новой версией."""
+        def bump():
+            cache.set(VERSION_KEY, uuid4().hex, None)
+
+        bump()
+        transaction.on_commit(bump)
+
+    def search(self, name='', limit=None):
+        """Сначала совпадения по началу, затем по подстроке, затем с
+        одной опечаткой в начале названия."""
+        snapshot = self._load()
+        query = name.strip().casefold()
+        if not query:
+            return snapshot.ingredients[:limit]
+        found = list(snapshot.prefix(query))
+        seen = set(found)
+        steps = [snapshot.contains]
+        if len(query) >= FUZZY_MIN_LENGTH:
+            steps.append(snapshot.fuzzy)
+        for step in steps:
+            if limit is not None and len(found) >= limit:
+                break
+            for position in step(query):
+                if position not in seen:
+                    seen.add(position)
+                    found.append(position)
+        return [snapshot.ingredients[position] for position in found[:limit]]
+
+    def _load(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        if self._snapshot is None or version != self._version:
+            with self._lock:
+                if self._snapshot is None or version != self._version:
+                    self._snapshot = Snapshot(Ingredient.objects.all())
+                    self._version = version
+        return self._snapshot
+
+
+ingredient_index = IngredientIndex()
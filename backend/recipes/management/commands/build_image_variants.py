@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ' Создать уменьшенные копии фото рецептов '
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии и у рецептов, где они уже есть'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        done = 0
+        for recipe_id, name in recipes.values_list('id', 'image').iterator():
+            try:
+                process_recipe_image(recipe_id, name)
+            except (OSError, ValueError) as error:
+                self.stdout.write(self.style.ERROR(f'{recipe_id}: {error}'))
+                continue
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано фото: {done}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.scores import BATCH_SIZE, compute_scores
+
+
+class Command(BaseCommand):
+    help = (' Пересчитать популярность рецептов для ordering=popular'
+            ' и ordering=trending ')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты, а не только с новыми событиями'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        updated = compute_scores(
+            full=options['full'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {updated}'
+        ))
@@ -1,25 +1,178 @@
+import csv
 import json
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from recipes.events import bulk_saved
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Ingredient, Tag
 
+DATA_DIR = Path(settings.BASE_DIR) / 'data'
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    """Потоковый разбор JSON-массива объектов без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив')
+                started = True
+                position += 1
+                continue
+            if position == len(buffer) or buffer[position] == ']':
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item
+        buffer = buffer[position:]
+    if buffer.strip() not in ('', ']'):
+        raise CommandError('Файл JSON обрывается на середине')
+
+
+def iter_json_lines(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(file):
+    yield from csv.DictReader(file)
+
+
+READERS = {
+    'json': iter_json_array,
+    'jsonl': iter_json_lines,
+    'csv': iter_csv,
+}
+
+
+def read_rows(path, file_format=None):
+    path = Path(path)
+    file_format = file_format or path.suffix.lstrip('.').lower()
+    if file_format not in READERS:
+        raise CommandError(
+            f'Неизвестный формат {file_format}, доступны: '
+            + ', '.join(READERS)
+        )
+    with open(path, encoding='utf-8') as data_file:
+        yield from READERS[file_format](data_file)
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 
 class Command(BaseCommand):
     help = ' Загрузить данные в модель ингредиентов '
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients', default=DATA_DIR / 'ingredients.json',
+            help='Файл ингредиентов: json, jsonl или csv'
+        )
+        parser.add_argument(
+            '--tags', default=DATA_DIR / 'tags.json',
+            help='Файл тегов: json, jsonl или csv'
+        )
+        parser.add_argument(
+            '--format', choices=tuple(READERS), default=None,
+            help='Формат файлов, если не совпадает с расширением'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать изменения, ничего не записывая'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING('Старт команды'))
-        with open('data/ingredients.json', encoding='utf-8',
-                  ) as data_file_ingredients:
-            ingredient_data = json.loads(data_file_ingredients.read())
-            for ingredients in ingredient_data:
-                Ingredient.objects.get_or_create(**ingredients)
-
-        with open('data/tags.json', encoding='utf-8',
-                  ) as data_file_tags:
-            tags_data = json.loads(data_file_tags.read())
-            for tags in tags_data:
-                Tag.objects.get_or_create(**tags)
+        self.options = options
+        ingredients = self.new_ingredients(
+            read_rows(options['ingredients'], options['format'])
+        )
+        tags, changed_tags = self.tag_changes(
+            read_rows(options['tags'], options['format'])
+        )
+        self.report('Новые ингредиенты', ingredients)
+        self.report('Новые теги', tags)
+        self.report('Изменённые теги', changed_tags, '~')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Пробный запуск, без записи'))
+            return
 
+        with transaction.atomic():
+            self.save(Ingredient, ingredients)
+            self.save(Tag, tags)
+            Tag.objects.bulk_update(
+                changed_tags, ('name', 'color'),
+                batch_size=options['batch_size']
+            )
+        # bulk_create и bulk_update не отправляют сигналы.
+        ingredient_index.invalidate()
+        bulk_saved.send(sender=Ingredient, objects=ingredients)
+        bulk_saved.send(sender=Tag, objects=[*tags, *changed_tags])
         self.stdout.write(self.style.SUCCESS('Данные загружены'))
+
+    def new_ingredients(self, rows):
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        ingredients = {}
+        for row in rows:
+            key = (row['name'].strip(), row['measurement_unit'].strip())
+            if key not in existing:
+                ingredients[key] = Ingredient(
+                    name=key[0], measurement_unit=key[1]
+                )
+        return list(ingredients.values())
+
+    def tag_changes(self, rows):
+        existing = Tag.objects.in_bulk(field_name='slug')
+        tags = {}
+        for row in rows:
+            tags[row['slug'].strip()] = Tag(
+                name=row['name'].strip(),
+                color=row['color'].strip(),
+                slug=row['slug'].strip(),
+            )
+        changed = []
+        for slug, tag in list(tags.items()):
+            current = existing.get(slug)
+            if current is None:
+                continue
+            del tags[slug]
+            if (current.name, current.color) != (tag.name, tag.color):
+                current.name, current.color = tag.name, tag.color
+                changed.append(current)
+        return list(tags.values()), changed
+
+    def save(self, model, objects):
+        size = self.options['batch_size']
+        saved = 0
+        for batch in batches(objects, size):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            saved += len(batch)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {saved} из {len(objects)}'
+            )
+
+    def report(self, title, objects, marker='+'):
+        self.stdout.write(f'{title}: {len(objects)}')
+        if self.options['dry_run'] or self.options['verbosity'] > 1:
+            for obj in objects:
+                self.stdout.write(f'  {marker} {obj}')
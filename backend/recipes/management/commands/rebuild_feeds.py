@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import BATCH_SIZE, rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = (' Заново заполнить ленты подписок пользователей'
+            ' с FEED_MATERIALIZE_FROM и более подписками ')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = rebuild_feeds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Лент в таблице: {users}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.search import BATCH_SIZE, update_search
+
+
+class Command(BaseCommand):
+    help = ' Пересобрать поисковый индекс рецептов '
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            update_search(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
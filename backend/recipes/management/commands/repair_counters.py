@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = ' Пересчитать счётчики избранного, корзин, рецептов и подписок '
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать число неверных значений, ничего не исправляя'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = repair_counters(dry_run=options['dry_run'])
+        for counter, count in fixed.items():
+            self.stdout.write(f'{counter}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            'Проверка завершена' if options['dry_run']
+            else 'Счётчики исправлены'
+        ))
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.18 on 2026-10-18 04:25
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Перед уникальным ограничением оставить по одному ингредиенту с
+    одинаковыми названием и единицей измерения."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        others = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep'])
+        for item in IngredientRecipe.objects.filter(ingredient__in=others):
+            kept = IngredientRecipe.objects.filter(
+                recipe_id=item.recipe_id, ingredient_id=duplicate['keep']
+            ).first()
+            if kept is None:
+                item.ingredient_id = duplicate['keep']
+                item.save(update_fields=('ingredient',))
+            else:
+                kept.amount += item.amount
+                kept.save(update_fields=('amount',))
+                item.delete()
+        others.delete()
+
+
+class Migration(migrations.Migration):
+    """Отдельно от схемы: в одной транзакции с изменением данных
+    PostgreSQL не даёт создать ограничение (pending trigger events)."""
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,109 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Копия recipes.scores на момент миграции.
+WEIGHTS = (
+    ('FavoriteRecipe', 2),
+    ('ShoppingCart', 1),
+)
+EPOCH = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+HALF_LIFE = 3 * 24 * 60 * 60
+BATCH_SIZE = 500
+
+
+def trending_score(events):
+    exponents = [
+        math.log2(weight) + (created - EPOCH).total_seconds() / HALF_LIFE
+        for weight, created in events
+    ]
+    if not exponents:
+        return 0.0
+    top = max(exponents)
+    return top + math.log2(sum(2 ** (value - top) for value in exponents))
+
+
+def fill_scores(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    started = django.utils.timezone.now()
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        batch = recipe_ids[start:start + BATCH_SIZE]
+        events = defaultdict(list)
+        for name, weight in WEIGHTS:
+            for recipe_id, created in apps.get_model(
+                'recipes', name
+            ).objects.filter(
+                recipe_id__in=batch
+            ).values_list('recipe_id', 'created'):
+                events[recipe_id].append((weight, created))
+        Recipe.objects.bulk_update([
+            Recipe(
+                id=recipe_id,
+                popular_score=sum(weight for weight, _ in events[recipe_id]),
+                trending_score=trending_score(events[recipe_id]),
+                scored_at=started,
+            )
+            for recipe_id in batch
+        ], ('popular_score', 'trending_score', 'scored_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Добавлен'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Добавлен'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popular_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность за последние дни'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='scored_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Популярность пересчитана'),
+        ),
+        migrations.AddIndex(
+            model_name='favoriterecipe',
+            index=models.Index(fields=['created'], name='favorite_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['created'], name='shopping_cart_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popular_score', '-id'], name='recipe_popular_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['scored_at'], name='recipe_scored_at_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_feeds(apps, schema_editor):
+    # Копия recipes.feed.rebuild_feeds на момент миграции.
+    threshold = settings.FEED_MATERIALIZE_FROM
+    if not threshold:
+        return
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscribe = apps.get_model('users', 'Subscribe')
+    user_ids = apps.get_model('users', 'User').objects.filter(
+        subscriptions_count__gte=threshold
+    ).values_list('id', flat=True)
+    for user_id in list(user_ids):
+        recipe_ids = Recipe.objects.filter(
+            author_id__in=Subscribe.objects.filter(
+                user_id=user_id
+            ).values('author_id')
+        ).values_list('id', flat=True).iterator()
+        while True:
+            batch = [
+                FeedEntry(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in islice(recipe_ids, BATCH_SIZE)
+            ]
+            if not batch:
+                break
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('users', '0004_subscriptions_count'),
+        ('recipes', '0007_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Рецепт в ленте',
+                'verbose_name_plural': 'Ленты подписок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# Копия схемы и документов recipes.search на момент миграции.
+TABLE = 'recipes_recipe_search'
+SCHEMA = {
+    'postgresql': (
+        f'CREATE TABLE {TABLE} ('
+        'recipe_id bigint PRIMARY KEY '
+        'REFERENCES recipes_recipe (id) ON DELETE CASCADE, '
+        'document tsvector NOT NULL)',
+        f'CREATE INDEX {TABLE}_document_idx ON {TABLE} USING gin (document)',
+    ),
+    'sqlite': (
+        f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+        'name, text, ingredients, '
+        "tokenize = 'unicode61 remove_diacritics 2')",
+    ),
+}
+DOCUMENTS = {
+    'postgresql': (
+        f'INSERT INTO {TABLE} (recipe_id, document) '
+        "SELECT r.id, setweight(to_tsvector('russian', r.name), 'A') "
+        "|| setweight(to_tsvector('russian', "
+        "coalesce(string_agg(i.name, ' '), '')), 'B') "
+        "|| setweight(to_tsvector('russian', r.text), 'C') "
+    ),
+    'sqlite': (
+        f'INSERT INTO {TABLE} (rowid, name, text, ingredients) '
+        "SELECT r.id, r.name, r.text, coalesce(group_concat(i.name, ' '), '') "
+    ),
+}
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in SCHEMA:
+        return
+    for statement in SCHEMA[vendor]:
+        schema_editor.execute(statement)
+    schema_editor.execute(
+        DOCUMENTS[vendor]
+        + 'FROM recipes_recipe r '
+        'LEFT JOIN recipes_ingredientrecipe ir ON ir.recipe_id = r.id '
+        'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+        'GROUP BY r.id'
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in SCHEMA:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.18 on 2026-10-18 05:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+TABLE = 'recipes_recipe_search'
+# В SQLite у таблицы FTS5 есть только rowid; столбец recipe_id нужен,
+# чтобы модель RecipeSearch присоединялась к рецептам как в PostgreSQL.
+COLUMNS = {
+    'forward': ('recipe_id UNINDEXED, ', 'rowid, recipe_id', 'r.id, r.id'),
+    'backward': ('', 'rowid', 'r.id'),
+}
+
+
+def rebuild_sqlite_table(direction):
+    def rebuild(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        extra_column, keys, values = COLUMNS[direction]
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+            f'{extra_column}name, text, ingredients, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {TABLE} ({keys}, name, text, ingredients) '
+            f'SELECT {values}, r.name, r.text, '
+            "coalesce(group_concat(i.name, ' '), '') "
+            'FROM recipes_recipe r '
+            'LEFT JOIN recipes_ingredientrecipe ir ON ir.recipe_id = r.id '
+            'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+            'GROUP BY r.id'
+        )
+    return rebuild
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearch',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ рецепта',
+                'verbose_name_plural': 'Поисковые документы рецептов',
+                'db_table': 'recipes_recipe_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(
+            rebuild_sqlite_table('forward'), rebuild_sqlite_table('backward')
+        ),
+    ]
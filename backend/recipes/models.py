@@ -1,6 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              UniqueConstraint, Value, Window)
+from django.db.models.functions import RowNumber
+
+from recipes.storage import ContentHashStorage
 
 User = get_user_model()
 
@@ -19,6 +24,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -48,6 +59,53 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Планирование запросов для выдачи рецептов."""
+
+    def with_related(self):
+        """Автор, теги и ингредиенты одним набором запросов."""
+        return self.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотации is_favorited и is_in_shopping_cart для пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def latest_by_author(self, authors, limit=None):
+        """Последние limit рецептов каждого автора одним запросом."""
+        queryset = self.filter(author__in=authors)
+        if limit is None:
+            return queryset.order_by('author_id', '-id')
+        ranked = queryset.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('id').desc(),
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            'ORDER BY author_id, id DESC',
+            (*params, limit)
+        )
+
+
 class Recipe(models.Model):
     """Модель рецептов"""
     author = models.ForeignKey(
@@ -62,7 +120,14 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         verbose_name='Фото блюда',
-        upload_to='recipes/'
+        upload_to='recipes/',
+        storage=ContentHashStorage()
+    )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии фото',
+        default=dict,
+        blank=True,
+        editable=False
     )
     text = models.CharField(
         verbose_name='Описание блюда',
@@ -82,15 +147,119 @@ class Recipe(models.Model):
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления',
     )
+    servings = models.PositiveSmallIntegerField(
+        verbose_name='Порций',
+        default=1,
+        validators=(MinValueValidator(1),)
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False
+    )
+    popular_score = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+        editable=False
+    )
+    trending_score = models.FloatField(
+        verbose_name='Популярность за последние дни',
+        default=0,
+        editable=False
+    )
+    scored_at = models.DateTimeField(
+        verbose_name='Популярность пересчитана',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
+        ordering = ('-id',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('author', '-id'),
+                name='recipe_author_id_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=('-in_carts_count', '-id'),
+                name='recipe_in_carts_count_idx'
+            ),
+            models.Index(
+                fields=('-popular_score', '-id'),
+                name='recipe_popular_score_idx'
+            ),
+            models.Index(
+                fields=('-trending_score', '-id'),
+                name='recipe_trending_score_idx'
+            ),
+            models.Index(
+                fields=('scored_at',),
+                name='recipe_scored_at_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.text} '
 
 
+class RecipeDocument(models.Model):
+    """Готовый JSON рецепта без полей, зависящих от пользователя."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='document'
+    )
+    content = models.TextField(
+        verbose_name='Документ'
+    )
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return f'Документ {self.recipe_id}'
+
+
+class RecipeSearch(models.Model):
+    """Поисковый документ рецепта.
+
+    Таблицу создают миграции и заполняет recipes.search, модель нужна,
+    чтобы присоединить её к рецептам в запросе поиска.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='search_document'
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_search'
+        verbose_name = 'Поисковый документ рецепта'
+        verbose_name_plural = 'Поисковые документы рецептов'
+
+    def __str__(self):
+        return f'Поисковый документ {self.recipe_id}'
+
+
 class IngredientRecipe(models.Model):
     """Модель, которая вкладывает нужное кол-во ингредиента в рецепт"""
     ingredient = models.ForeignKey(
@@ -116,6 +285,12 @@ class IngredientRecipe(models.Model):
                 name='unique ingredient in recipe'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=('ingredient', 'recipe'),
+                name='ingredient_recipe_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.ingredient} {self.recipe}'
@@ -135,6 +310,17 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         related_name='shopping_cart'
     )
+    servings = models.PositiveSmallIntegerField(
+        verbose_name='Порций',
+        help_text='Пусто - сколько в рецепте',
+        null=True,
+        blank=True,
+        validators=(MinValueValidator(1),)
+    )
+    created = models.DateTimeField(
+        verbose_name='Добавлен',
+        auto_now_add=True
+    )
 
     class Meta:
         verbose_name = 'Рецепты в корзине'
@@ -145,6 +331,16 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='shopping_cart_recipe_user_idx'
+            ),
+            models.Index(
+                fields=('created',),
+                name='shopping_cart_created_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.recipe} в корзине {self.user}'
@@ -164,6 +360,10 @@ class FavoriteRecipe(models.Model):
         verbose_name='Рецепт',
         related_name='favorite'
     )
+    created = models.DateTimeField(
+        verbose_name='Добавлен',
+        auto_now_add=True
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -174,6 +374,45 @@ class FavoriteRecipe(models.Model):
                 name='unique_favorite '
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='favorite_recipe_user_idx'
+            ),
+            models.Index(
+                fields=('created',),
+                name='favorite_created_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.recipe} в избранном у {self.user}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика с большим числом подписок."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries'
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
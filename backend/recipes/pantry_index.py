@@ -0,0 +1,314 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import IngredientRecipe
+
+VERSION_KEY = 'pantry_index_version'
+SEQUENCE_KEY = 'pantry_index_sequence'
+CHANGE_KEY = 'pantry_index_change:{}'
+# Сколько хранятся и сколько догоняются изменения, дальше - перестройка.
+CHANGE_TIMEOUT = 60 * 60
+MAX_CHANGES = 1000
+CHUNK_SIZE = 10000
+# Ингредиент хотя бы в каждом DENSITY-м рецепте хранится битовой маской:
+# она тогда не больше массива восьмибайтовых позиций.
+DENSITY = 64
+
+
+def to_bitmap(positions):
+    if not positions:
+        return 0
+    bits = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(bitmap):
+        return bin(bitmap).count('1')
+
+
+def top_positions(bitmap, start, stop):
+    """Позиции установленных битов с start по stop, от старших."""
+    digits = format(bitmap, 'b')
+    found = []
+    index = digits.find('1')
+    for number in range(stop):
+        if index == -1:
+            break
+        if number >= start:
+            found.append(len(digits) - 1 - index)
+        index = digits.find('1', index + 1)
+    return found
+
+
+class Matches:
+    """Подобранные рецепты по корзинам (недостаёт, есть, маска).
+
+    Поддерживает len и срезы, поэтому страницы отдаёт обычный Paginator;
+    id рецептов извлекаются только для запрошенной страницы.
+    """
+
+    def __init__(self, ids, buckets):
+        self.ids = ids
+        self.buckets = [
+            (missing, found, bitmap, popcount(bitmap))
+            for missing, found, bitmap in buckets
+        ]
+
+    def __len__(self):
+        return sum(bucket[3] for bucket in self.buckets)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        items = []
+        offset = 0
+        for missing, found, bitmap, count in self.buckets:
+            if offset >= stop:
+                break
+            low = max(start, offset) - offset
+            high = min(stop, offset + count) - offset
+            if low < high:
+                items += [
+                    (missing, found, self.ids[position])
+                    for position in top_positions(bitmap, low, high)
+                ]
+            offset += count
+        return items
+
+
+class FoundCounter:
+    """Число найденных ингредиентов каждого рецепта по разрядам.
+
+    Маски ингредиентов складываются столбиком: slices[j] - маска
+    рецептов, у которых j-й бит числа найденных ингредиентов равен 1.
+    Все операции идут над целыми масками, без цикла по рецептам.
+    """
+
+    def __init__(self, bitmaps):
+        self.candidates = 0
+        self.slices = []
+        self._exactly = {}
+        for carry in bitmaps:
+            self.candidates |= carry
+            for index, value in enumerate(self.slices):
+                self.slices[index] = value ^ carry
+                carry &= value
+                if not carry:
+                    break
+            if carry:
+                self.slices.append(carry)
+
+    def exactly(self, found):
+        """Маска рецептов ровно с found найденными ингредиентами."""
+        if found not in self._exactly:
+            mask = self.candidates if found < 1 << len(self.slices) else 0
+            for index, value in enumerate(self.slices):
+                if not mask:
+                    break
+                mask &= value if found >> index & 1 else (
+                    self.candidates ^ value
+                )
+            self._exactly[found] = mask
+        return self._exactly[found]
+
+
+class Snapshot:
+    """Обратный индекс: ингредиент -> рецепты.
+
+    Рецепты пронумерованы позициями по возрастанию id. Редкий ингредиент
+    хранит отсортированный массив позиций, частый - битовую маску в int.
+    Отдельно хранятся маски рецептов с одинаковым числом ингредиентов.
+    """
+
+    def __init__(self, rows):
+        self.ids = array('L')
+        self.positions = {}
+        self.recipes = {}
+        postings = {}
+        for recipe_id, ingredient_id in rows:
+            position = self.positions.get(recipe_id)
+            if position is None:
+                position = self.positions[recipe_id] = len(self.ids)
+                self.ids.append(recipe_id)
+                self.recipes[position] = []
+            self.recipes[position].append(ingredient_id)
+            postings.setdefault(ingredient_id, array('L')).append(position)
+        self.dense_from = max(len(self.ids) // DENSITY, 1)
+        self.postings = {
+            ingredient_id: (
+                to_bitmap(posting) if len(posting) >= self.dense_from
+                else posting
+            )
+            for ingredient_id, posting in postings.items()
+        }
+        by_size = {}
+        for position, ingredients in self.recipes.items():
+            by_size.setdefault(len(ingredients), []).append(position)
+            self.recipes[position] = tuple(ingredients)
+        self.sizes = {
+            size: to_bitmap(positions) for size, positions in by_size.items()
+        }
+
+    def bitmap(self, ingredient_id):
+        posting = self.postings.get(ingredient_id, 0)
+        if isinstance(posting, int):
+            return posting
+        return to_bitmap(posting)
+
+    def patch(self, recipe_ids, rows):
+        """Заменяет ингредиенты рецептов; рецепта без строк больше нет."""
+        fresh = {}
+        for recipe_id, ingredient_id in rows:
+            fresh.setdefault(recipe_id, []).append(ingredient_id)
+        for recipe_id in recipe_ids:
+            position = self.positions.get(recipe_id)
+            if position is not None:
+                self._remove(position)
+            ingredients = fresh.get(recipe_id)
+            if not ingredients:
+                continue
+            if position is None:
+                position = self.positions[recipe_id] = len(self.ids)
+                self.ids.append(recipe_id)
+            self._add(position, tuple(ingredients))
+
+    def _remove(self, position):
+        ingredients = self.recipes.pop(position, ())
+        bit = 1 << position
+        for ingredient_id in ingredients:
+            posting = self.postings[ingredient_id]
+            if isinstance(posting, int):
+                self.postings[ingredient_id] = posting & ~bit
+                continue
+            index = bisect_left(posting, position)
+            if index < len(posting) and posting[index] == position:
+                del posting[index]
+        if ingredients:
+            self.sizes[len(ingredients)] &= ~bit
+
+    def _add(self, position, ingredients):
+        self.recipes[position] = ingredients
+        bit = 1 << position
+        for ingredient_id in ingredients:
+            posting = self.postings.setdefault(ingredient_id, array('L'))
+            if isinstance(posting, int):
+                self.postings[ingredient_id] = posting | bit
+                continue
+            if not posting or posting[-1] < position:
+                posting.append(position)
+            else:
+                insort(posting, position)
+            if len(posting) >= self.dense_from:
+                self.postings[ingredient_id] = to_bitmap(posting)
+        size = len(ingredients)
+        self.sizes[size] = self.sizes.get(size, 0) | bit
+
+    def match(self, ingredient_ids, max_missing=None):
+        """Рецепты хотя бы с одним ингредиентом из набора."""
+        counter = FoundCounter(map(self.bitmap, set(ingredient_ids)))
+        sizes = sorted(self.sizes, reverse=True)
+        largest = sizes[0] if sizes and counter.candidates else 0
+        if max_missing is not None:
+            largest = min(largest, max_missing + 1)
+        buckets = []
+        # При равном числе недостающих доля имеющихся больше у рецептов
+        # с большим числом ингредиентов.
+        for missing in range(largest):
+            for size in sizes:
+                if size <= missing:
+                    break
+                bucket = self.sizes[size] & counter.exactly(size - missing)
+                if bucket:
+                    buckets.append((missing, size - missing, bucket))
+        return Matches(self.ids, buckets)
+
+
+class PantryIndex:
+    """Подбор рецептов по ингредиентам, которые есть у пользователя.
+
+    Индекс строится в памяти процесса один раз. Изменения ингредиентов
+    рецептов записываются в общий кэш под последовательными номерами,
+    и каждый процесс при следующем запросе перечитывает только
+    изменённые рецепты. Если изменений слишком много или часть уже
+    вытеснена из кэша, индекс строится заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._sequence = 0
+        self._snapshot = None
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, uuid4().hex, None)
+
+    def changed(self, recipe_ids):
+        """Отметить изменение рецептов после фиксации транзакции."""
+        recipe_ids = set(recipe_ids)
+        if recipe_ids:
+            transaction.on_commit(lambda: self._record(recipe_ids))
+
+    def match(self, ingredient_ids, max_missing=None):
+        """Рецепты в порядке выдачи: сначала те, которым недостаёт
+        меньше ингредиентов, затем с большей долей имеющихся, затем
+        новые. Элементы - (недостаёт, есть, id рецепта)."""
+        with self._lock:
+            self._sync()
+            return self._snapshot.match(ingredient_ids, max_missing)
+
+    def _record(self, recipe_ids):
+        cache.add(SEQUENCE_KEY, 0, None)
+        sequence = cache.incr(SEQUENCE_KEY)
+        cache.set(CHANGE_KEY.format(sequence), recipe_ids, CHANGE_TIMEOUT)
+
+    def _sync(self):
+        values = cache.get_many((VERSION_KEY, SEQUENCE_KEY))
+        version = values.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        sequence = values.get(SEQUENCE_KEY, 0)
+        if self._snapshot is None or version != self._version:
+            self._rebuild(version, sequence)
+        elif sequence > self._sequence:
+            self._catch_up(version, sequence)
+
+    def _rebuild(self, version, sequence):
+        # Номер берётся до чтения базы: изменения, случившиеся во время
+        # перестройки, будут применены повторно, это безопасно.
+        self._snapshot = Snapshot(
+            IngredientRecipe.objects.order_by('recipe_id').values_list(
+                'recipe_id', 'ingredient_id'
+            ).iterator(chunk_size=CHUNK_SIZE)
+        )
+        self._version = version
+        self._sequence = sequence
+
+    def _catch_up(self, version, sequence):
+        keys = [
+            CHANGE_KEY.format(number)
+            for number in range(self._sequence + 1, sequence + 1)
+        ]
+        changes = cache.get_many(keys) if len(keys) <= MAX_CHANGES else {}
+        if len(changes) < len(keys):
+            self._rebuild(version, sequence)
+            return
+        recipe_ids = set().union(*changes.values())
+        self._snapshot.patch(recipe_ids, IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'))
+        self._sequence = sequence
+
+
+pantry_index = PantryIndex()
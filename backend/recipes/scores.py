@@ -0,0 +1,81 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.apps import apps as global_apps
+from django.db.models import Max
+from django.utils import timezone
+
+# Вес события: избранное говорит об интересе больше, чем корзина.
+WEIGHTS = (
+    ('recipes.FavoriteRecipe', 2),
+    ('recipes.ShoppingCart', 1),
+)
+EPOCH = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+# За это время вклад события в trending уменьшается вдвое, секунд.
+HALF_LIFE = 3 * 24 * 60 * 60
+BATCH_SIZE = 500
+
+
+def trending_score(events):
+    """log2 суммы весов, удвоенных за каждый HALF_LIFE от EPOCH.
+
+    Затухание всех рецептов к текущему моменту - один общий множитель,
+    поэтому порядок по такому счёту совпадает с порядком по затухающей
+    сумме, и без новых событий счёт пересчитывать не нужно.
+    """
+    exponents = [
+        math.log2(weight) + (created - EPOCH).total_seconds() / HALF_LIFE
+        for weight, created in events
+    ]
+    if not exponents:
+        return 0.0
+    top = max(exponents)
+    return top + math.log2(sum(2 ** (value - top) for value in exponents))
+
+
+def active_recipes(apps, since):
+    """Рецепты, которые добавляли в избранное или корзину после since."""
+    recipe_ids = set()
+    for label, _ in WEIGHTS:
+        recipe_ids.update(
+            apps.get_model(label).objects.filter(created__gte=since)
+            .values_list('recipe_id', flat=True)
+        )
+    return recipe_ids
+
+
+def compute_scores(apps=global_apps, full=False, batch_size=BATCH_SIZE):
+    """Пересчитывает popular_score и trending_score.
+
+    Без full затрагиваются только рецепты с событиями после прошлого
+    пересчёта. Удаление из избранного и корзины событием не считается,
+    его учтёт полный пересчёт. Возвращает число обновлённых рецептов.
+    """
+    Recipe = apps.get_model('recipes.Recipe')
+    started = timezone.now()
+    since = None
+    if not full:
+        since = Recipe.objects.aggregate(last=Max('scored_at'))['last']
+    if since is None:
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    else:
+        recipe_ids = sorted(active_recipes(apps, since))
+    for start in range(0, len(recipe_ids), batch_size):
+        batch = recipe_ids[start:start + batch_size]
+        events = defaultdict(list)
+        for label, weight in WEIGHTS:
+            for recipe_id, created in apps.get_model(label).objects.filter(
+                recipe_id__in=batch
+            ).values_list('recipe_id', 'created'):
+                events[recipe_id].append((weight, created))
+        Recipe.objects.bulk_update([
+            Recipe(
+                id=recipe_id,
+                popular_score=sum(weight for weight, _ in events[recipe_id]),
+                trending_score=trending_score(events[recipe_id]),
+                scored_at=started,
+            )
+            for recipe_id in batch
+        ], ('popular_score', 'trending_score', 'scored_at'))
+    return len(recipe_ids)
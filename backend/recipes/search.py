@@ -0,0 +1,124 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+TABLE = 'recipes_recipe_search'
+BATCH_SIZE = 500
+WORD = re.compile(r'\w+')
+# Окончания, которые отбрасываются перед поиском по префиксу в SQLite.
+ENDINGS = 'аеёиоуыэюяйь'
+# Вес столбцов recipe_id, name, text и ingredients для bm25 в SQLite.
+SQLITE_WEIGHTS = '0.0, 10.0, 1.0, 4.0'
+RANK = 'search_rank'
+
+# Название весит больше ингредиентов, ингредиенты - больше описания.
+DOCUMENTS = {
+    'postgresql': (
+        f'INSERT INTO {TABLE} (recipe_id, document) '
+        "SELECT r.id, setweight(to_tsvector('russian', r.name), 'A') "
+        "|| setweight(to_tsvector('russian', "
+        "coalesce(string_agg(i.name, ' '), '')), 'B') "
+        "|| setweight(to_tsvector('russian', r.text), 'C') "
+    ),
+    'sqlite': (
+        f'INSERT INTO {TABLE} (rowid, recipe_id, name, text, ingredients) '
+        'SELECT r.id, r.id, r.name, r.text, '
+        "coalesce(group_concat(i.name, ' '), '') "
+    ),
+}
+KEYS = {'postgresql': 'recipe_id', 'sqlite': 'rowid'}
+
+
+def update_search(recipe_ids=None, using=DEFAULT_DB_ALIAS,
+                  batch_size=BATCH_SIZE):
+    """Пересобирает поисковые документы рецептов, по умолчанию всех.
+
+    Документ удалённого рецепта просто исчезает из индекса.
+    """
+    connection = connections[using]
+    if connection.vendor not in DOCUMENTS:
+        return
+    key = KEYS[connection.vendor]
+    with connection.cursor() as cursor:
+        if recipe_ids is None:
+            cursor.execute('SELECT id FROM recipes_recipe')
+            recipe_ids = [row[0] for row in cursor.fetchall()]
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), batch_size):
+            batch = recipe_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE {key} IN ({placeholders})', batch
+            )
+            cursor.execute(
+                DOCUMENTS[connection.vendor]
+                + 'FROM recipes_recipe r '
+                'LEFT JOIN recipes_ingredientrecipe ir '
+                'ON ir.recipe_id = r.id '
+                'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+                f'WHERE r.id IN ({placeholders}) GROUP BY r.id',
+                batch
+            )
+
+
+def schedule_search_update(recipe_ids):
+    """Обновить документы после фиксации транзакции, когда все
+    ингредиенты рецептов уже записаны."""
+    recipe_ids = set(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: update_search(recipe_ids))
+
+
+def fts_query(terms):
+    """Запрос FTS5: все слова, каждое - префиксом без окончания.
+
+    Стемминга для русского в SQLite нет, префикс его приближает.
+    """
+    stems = []
+    for word in terms:
+        stem = word
+        while len(stem) > 4 and stem[-1] in ENDINGS:
+            stem = stem[:-1]
+        stems.append(f'"{stem}"*')
+    return ' '.join(stems)
+
+
+def rank_fields(queryset):
+    """Ранг поиска для values(), если рецепты найдены поиском."""
+    return (RANK,) if RANK in queryset.query.annotations else ()
+
+
+def search_recipes(queryset, query):
+    """Рецепты по тексту запроса, самые релевантные первыми.
+
+    Из запроса берутся только слова, пунктуация отбрасывается; запрос
+    без слов ничего не находит на любой базе. Поисковая таблица
+    присоединяется к рецептам, так что совпадения и их ранг вычисляются
+    одним проходом по индексу.
+    """
+    terms = WORD.findall(query.lower())
+    if not terms:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('russian', %s)"
+        params = [' '.join(terms)]
+        match = f'{TABLE}.document @@ {tsquery}'
+        rank = f'ts_rank({TABLE}.document, {tsquery})'
+        rank_params = params
+    elif vendor == 'sqlite':
+        params = [fts_query(terms)]
+        match = f'{TABLE} MATCH %s'
+        rank = f'-bm25({TABLE}, {SQLITE_WEIGHTS})'
+        rank_params = []
+    else:
+        return queryset.filter(Q(name__icontains=query)
+                               | Q(text__icontains=query))
+    return queryset.filter(
+        RawSQL(match, params, output_field=BooleanField()),
+        search_document__isnull=False,
+    ).annotate(
+        **{RANK: RawSQL(rank, rank_params, output_field=FloatField())}
+    ).order_by(f'-{RANK}', '-id')
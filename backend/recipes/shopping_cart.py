@@ -0,0 +1,99 @@
+from fractions import Fraction
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from foodgram.metrics import registry
+from recipes.models import ShoppingCart
+from recipes.units import as_number, from_base, to_base
+
+VERSION_KEY = 'shopping_cart_version:{}'
+INGREDIENTS_KEY = 'shopping_list:{}:{}'
+
+
+def cart_version(user_id):
+    """Текущая версия корзины, меняется при любом её изменении."""
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key)
+    return version
+
+
+def invalidate_carts(user_ids):
+    """Сбросить агрегированные списки покупок пользователей.
+
+    Версии меняются ещё раз после фиксации транзакции, чтобы список,
+    собранный до неё по старым строкам, не попал в кэш под новой версией.
+    """
+    keys = [VERSION_KEY.format(user_id) for user_id in user_ids]
+    if not keys:
+        return
+
+    def bump():
+        cache.set_many({key: uuid4().hex for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_recipe_carts(recipe_ids):
+    """Сбросить списки покупок всех, у кого рецепты лежат в корзине."""
+    invalidate_carts(set(ShoppingCart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('user_id', flat=True)))
+
+
+def cart_rows(user):
+    """Ингредиенты всех рецептов корзины с порциями, одним запросом."""
+    return ShoppingCart.objects.filter(
+        user=user, recipe__ingredientrecipe__isnull=False
+    ).values_list(
+        'recipe__ingredientrecipe__ingredient__name',
+        'recipe__ingredientrecipe__ingredient__measurement_unit',
+        'recipe__ingredientrecipe__amount',
+        'servings',
+        'recipe__servings',
+    )
+
+
+def aggregate_ingredients(rows):
+    """Суммы по названию и семейству единиц, по алфавиту.
+
+    Количество умножается на отношение порций в корзине к порциям
+    рецепта и переводится в базовую единицу: граммы и килограммы одного
+    ингредиента складываются в одну строку.
+    """
+    totals = {}
+    names = {}
+    for name, unit, amount, servings, recipe_servings in rows:
+        scale = Fraction(servings or recipe_servings, recipe_servings)
+        base, value = to_base(unit, amount * scale)
+        key = (name.casefold(), base)
+        names.setdefault(key, name)
+        totals[key] = totals.get(key, 0) + value
+    ingredients = []
+    for key in sorted(totals):
+        unit, amount = from_base(key[1], totals[key])
+        ingredients.append({
+            'name': names[key],
+            'measurement_unit': unit,
+            'amount': as_number(amount),
+        })
+    return ingredients
+
+
+def shopping_cart_ingredients(user):
+    """Список покупок корзины, из кэша или посчитанный заново."""
+    key = INGREDIENTS_KEY.format(user.id, cart_version(user.id))
+    ingredients = cache.get(key)
+    registry.inc('foodgram_cache_requests_total', cache='shopping_list',
+                 result='miss' if ingredients is None else 'hit')
+    if ingredients is None:
+        ingredients = aggregate_ingredients(cart_rows(user))
+        cache.set(key, ingredients, settings.SHOPPING_CART_CACHE_TIMEOUT)
+    return ingredients
@@ -0,0 +1,25 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Имя файла - хеш содержимого.
+
+    Одинаковые файлы хранятся один раз, а раз содержимое по имени не
+    меняется, его можно кэшировать навсегда.
+    """
+
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest.hexdigest()[:32] + extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
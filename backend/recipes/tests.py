@@ -0,0 +1,106 @@
+from django.test import TestCase
+
+from recipes.counters import repair_counters
+from recipes.ingredient_index import ingredient_index
+from recipes.models import FavoriteRecipe, Ingredient, Recipe, ShoppingCart
+from recipes.search import search_recipes, update_search
+from users.models import Subscribe, User
+
+
+class IngredientIndexTest(TestCase):
+
+    def test_search_has_no_duplicates(self):
+        # «Аа» совпадает и по началу, и по подстроке.
+        first = Ingredient.objects.create(name='Аа', measurement_unit='г')
+        second = Ingredient.objects.create(name='баа', measurement_unit='г')
+        self.assertEqual(
+            [item.id for item in ingredient_index.search('а', 10)],
+            [first.id, second.id]
+        )
+
+    def test_typos_are_ordered_by_distance(self):
+        # По алфавиту все макароны были бы раньше муки.
+        for name in ('макаронные изделия', 'макароны', 'макароны баветте',
+                     'макароны букатини', 'макароны орзо', 'мука'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        self.assertEqual(
+            [item.name for item in ingredient_index.search('мюка', 5)][:2],
+            ['мука', 'макароны']
+        )
+
+
+class SearchRecipesTest(TestCase):
+
+    def setUp(self):
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru'
+        )
+        self.borsch = Recipe.objects.create(
+            author=author, name='Борщ', text='Суп со свеклой',
+            cooking_time=60, image='recipes/borsch.jpg'
+        )
+        Recipe.objects.create(
+            author=author, name='Блины', text='На молоке',
+            cooking_time=30, image='recipes/pancakes.jpg'
+        )
+        # Документы поиска обновляются после фиксации транзакции.
+        update_search()
+
+    def test_punctuation_finds_nothing(self):
+        for query in ('?!', '  ', '"-"'):
+            with self.subTest(query=query):
+                self.assertFalse(
+                    search_recipes(Recipe.objects.all(), query).exists()
+                )
+
+    def test_words_are_found(self):
+        self.assertEqual(
+            list(search_recipes(Recipe.objects.all(), 'борщ!')),
+            [self.borsch]
+        )
+
+
+class CountersTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(
+            username='author', email='author@foodgram.ru'
+        )
+        self.reader = User.objects.create(
+            username='reader', email='reader@foodgram.ru'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Борщ', text='Суп со свеклой',
+            cooking_time=60, image='recipes/borsch.jpg'
+        )
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        FavoriteRecipe.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+
+    def assertCountersAreExact(self):
+        self.assertFalse(any(repair_counters(dry_run=True).values()))
+
+    def test_rows_are_counted(self):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.in_carts_count),
+            (1, 1)
+        )
+        self.assertEqual(
+            (self.author.recipes_count, self.author.subscribers_count),
+            (1, 1)
+        )
+        self.assertCountersAreExact()
+
+    def test_deleted_user_is_uncounted(self):
+        self.reader.delete()
+        self.assertCountersAreExact()
+        self.author.delete()
+        self.assertCountersAreExact()
+
+    def test_deleted_rows_are_uncounted(self):
+        FavoriteRecipe.objects.all().delete()
+        Subscribe.objects.get().delete()
+        self.recipe.delete()
+        self.assertCountersAreExact()
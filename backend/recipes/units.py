@@ -0,0 +1,42 @@
+from fractions import Fraction
+
+# Единица -> (базовая единица семейства, сколько базовых в одной).
+CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'ч. л.': ('ч. л.', 1),
+    'ст. л.': ('ч. л.', 3),
+}
+# Единицы вывода каждого семейства, от крупной к мелкой.
+DISPLAY_UNITS = {
+    'г': ('кг', 'г'),
+    'мл': ('л', 'мл'),
+    'ч. л.': ('ст. л.', 'ч. л.'),
+}
+
+
+def to_base(unit, amount):
+    """Количество в базовой единице; незнакомая единица - сама себе база."""
+    unit = ' '.join(unit.split())
+    base, factor = CONVERSIONS.get(unit, (unit, 1))
+    return base, amount * factor
+
+
+def from_base(base, amount):
+    """Самая крупная единица, в которой количество не меньше 1
+    и записывается не более чем двумя знаками после запятой."""
+    for unit in DISPLAY_UNITS.get(base, ()):
+        value = Fraction(amount) / CONVERSIONS[unit][1]
+        if value >= 1 and (value * 100).denominator == 1:
+            return unit, value
+    return base, amount
+
+
+def as_number(amount):
+    """Целое, если делится нацело, иначе округлённое до сотых."""
+    amount = Fraction(amount)
+    if amount.denominator == 1:
+        return amount.numerator
+    return round(float(amount), 2)
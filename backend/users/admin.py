@@ -12,6 +12,9 @@ class UserAdmin(UserAdmin):
         'email',
         'first_name',
         'last_name',
+        'recipes_count',
+        'subscribers_count',
+        'subscriptions_count',
     )
     list_filter = ('email', 'first_name')
 
@@ -14,6 +14,21 @@ class User(AbstractUser):
         max_length=254,
         unique=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        editable=False
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        'Подписок',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ['id']
@@ -46,6 +61,11 @@ class Subscribe(models.Model):
                 fields=['user', 'author'],
                 name='unique_subscribe')
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='subscribe_author_user_idx')
+        ]
 
     def __str__(self):
         return f'{self.user} подписался на {self.author}'